@@ -0,0 +1,5 @@
+"""
+Benchmarks of the pyramid_es client's hot paths. Run them from a source
+checkout with ``python -m benchmarks.run``, and compare two result files with
+``python -m benchmarks.compare``.
+"""
@@ -0,0 +1,74 @@
+"""
+Compare two result files written by :py:mod:`benchmarks.run`::
+
+    python -m benchmarks.compare base.json new.json [--threshold 0.1]
+
+Benchmarks are compared on their median time per operation. The exit status
+is 1 if any benchmark is slower than the base by more than ``threshold``.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import argparse
+import json
+import sys
+
+
+def per_op(result):
+    return result['median'] / result['n']
+
+
+def compare(base, new, threshold):
+    """
+    Yield ``(name, base_time, new_time, change, status)`` for each benchmark
+    in both result sets, where times are per operation and ``change`` is the
+    relative difference.
+    """
+    for name, new_result in new['results'].items():
+        base_result = base['results'].get(name)
+        if base_result is None:
+            continue
+        base_time = per_op(base_result)
+        new_time = per_op(new_result)
+        change = new_time / base_time - 1
+        if change > threshold:
+            status = 'slower'
+        elif change < -threshold:
+            status = 'faster'
+        else:
+            status = ''
+        yield name, base_time, new_time, change, status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Compare two pyramid_es benchmark result files.')
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative change to report (default: 0.1)')
+    options = parser.parse_args(argv)
+
+    with open(options.base) as f:
+        base = json.load(f)
+    with open(options.new) as f:
+        new = json.load(f)
+
+    for label, data in (('base', base), ('new', new)):
+        env = data['environment']
+        print('%-5s %s (%s), Python %s' % (label, env['pyramid_es'],
+                                           env['git_revision'] or '?',
+                                           env['python']))
+    print('%-20s %12s %12s %8s' % ('benchmark', 'base (us)', 'new (us)',
+                                   'change'))
+    regressions = 0
+    for name, base_time, new_time, change, status in compare(
+            base, new, options.threshold):
+        print('%-20s %12.2f %12.2f %+7.1f%% %s' % (
+            name, base_time * 1e6, new_time * 1e6, change * 100, status))
+        if status == 'slower':
+            regressions += 1
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
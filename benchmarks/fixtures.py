@@ -0,0 +1,130 @@
+"""
+Models, data and a fake ``elasticsearch`` transport for the benchmarks.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from elasticsearch.connection import Connection
+from sqlalchemy import Column, ForeignKey, types, orm
+from sqlalchemy.ext.declarative import declarative_base
+
+from pyramid_es.client import ElasticClient
+from pyramid_es.mixin import ElasticMixin, ESMapping, ESString, ESField
+
+
+Base = declarative_base()
+
+
+class Author(Base):
+    __tablename__ = 'authors'
+    id = Column(types.Integer, primary_key=True)
+    name = Column(types.Unicode(100))
+    email = Column(types.Unicode(100))
+
+
+class Article(Base, ElasticMixin):
+    __tablename__ = 'articles'
+    id = Column(types.Integer, primary_key=True)
+    title = Column(types.Unicode(200))
+    content = Column(types.UnicodeText)
+    pubdate = Column(types.DateTime)
+    price = Column(types.Numeric(10, 2))
+    tag_list = Column(types.Unicode(200))
+    author_id = Column(None, ForeignKey('authors.id'))
+
+    author = orm.relationship('Author')
+
+    @classmethod
+    def elastic_mapping(cls):
+        return ESMapping(
+            analyzer='content',
+            properties=ESMapping(
+                ESString('title', boost=5.0),
+                ESString('content'),
+                ESField('pubdate'),
+                ESField('price'),
+                ESString('tags', attr='tag_list',
+                         filter=lambda s: s.split(',')),
+                author=ESMapping(
+                    properties=ESMapping(
+                        ESString('name'),
+                        ESString('email')))))
+
+
+CONTENT = '<p>%s</p>' % ('Lorem ipsum dolor sit amet, consectetur. ' * 50)
+
+
+def make_articles(n):
+    """
+    Return ``n`` transient articles, sharing a few authors.
+    """
+    authors = [Author(id=i, name='Author %d' % i,
+                      email='author%d@example.com' % i)
+               for i in range(20)]
+    start = datetime(2015, 1, 1)
+    return [Article(id=i,
+                    title='Article number %d' % i,
+                    content=CONTENT,
+                    pubdate=start + timedelta(hours=i),
+                    price=Decimal('%d.99' % (i % 100)),
+                    tag_list='tag%d,tag%d' % (i % 7, i % 11),
+                    author=authors[i % len(authors)],
+                    author_id=i % len(authors))
+            for i in range(n)]
+
+
+def make_search_response(n):
+    """
+    Return a ``_search`` response with ``n`` article hits, as ES would send
+    it.
+    """
+    hits = []
+    for article in make_articles(n):
+        doc = article.elastic_document()
+        doc_id = doc.pop('_id')
+        hits.append({'_index': 'bench', '_type': 'Article',
+                     '_id': str(doc_id), '_score': 1.0,
+                     '_source': json.loads(json.dumps(doc, default=str))})
+    return {'took': 2, 'timed_out': False,
+            '_shards': {'total': 1, 'successful': 1, 'failed': 0},
+            'hits': {'total': n, 'max_score': 1.0, 'hits': hits}}
+
+
+class FakeConnection(Connection):
+    """
+    An ``elasticsearch`` connection which answers in memory, so that the
+    client and transport code can be timed without any network I/O. Bulk
+    requests succeed, and searches return :py:attr:`search_body`.
+    """
+    search_body = '{"took":1,"hits":{"total":0,"hits":[]}}'
+
+    def perform_request(self, method, url, params=None, body=None,
+                        timeout=None, ignore=()):
+        if url.endswith('/_bulk'):
+            return 200, {}, self.bulk(body)
+        if url.endswith('/_search'):
+            return 200, {}, self.search_body
+        return 200, {}, '{}'
+
+    def bulk(self, body):
+        items = []
+        lines = iter(body.splitlines())
+        for line in lines:
+            op_type, = json.loads(line)
+            if op_type != 'delete':
+                next(lines)
+            items.append('{"%s":{"status":200}}' % op_type)
+        return '{"took":1,"errors":false,"items":[%s]}' % ','.join(items)
+
+
+def make_client(**kw):
+    """
+    Return a client whose transport uses :py:class:`FakeConnection`.
+    """
+    return ElasticClient(servers=['fake:9200'], index='bench',
+                         transport_options={
+                             'connection_class': FakeConnection},
+                         **kw)
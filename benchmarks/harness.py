@@ -0,0 +1,120 @@
+"""
+A minimal benchmark runner with machine-readable results.
+
+Benchmarks are registered with the :py:func:`benchmark` decorator on a setup
+function, which is called with a :py:class:`Context` and returns a callable
+performing ``ctx.n`` operations. The callable is run once to warm up, then
+timed ``repeat`` times.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import platform
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+from timeit import default_timer
+
+import elasticsearch
+
+import pyramid_es
+
+
+BENCHMARKS = OrderedDict()
+
+
+class Context(object):
+    """
+    Passed to benchmark setup functions: ``n`` is the number of operations
+    to perform per run, and ``options`` the command line options.
+    """
+
+    def __init__(self, n, options):
+        self.n = n
+        self.options = options
+        self._cleanups = []
+
+    def add_cleanup(self, f, *args):
+        self._cleanups.append((f, args))
+
+    def cleanup(self):
+        while self._cleanups:
+            f, args = self._cleanups.pop()
+            f(*args)
+
+
+def benchmark(n, unit='op'):
+    """
+    Register a benchmark of ``n`` operations per run, named after the
+    decorated setup function. ``unit`` names what an operation is in the
+    report.
+    """
+    def register(setup):
+        BENCHMARKS[setup.__name__] = (setup, n, unit)
+        return setup
+    return register
+
+
+def median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2
+
+
+def run_benchmark(name, options):
+    """
+    Run the benchmark ``name`` and return a dict of its results. Times are in
+    seconds per run.
+    """
+    setup, n, unit = BENCHMARKS[name]
+    n = max(1, int(n * options.scale))
+    ctx = Context(n, options)
+    try:
+        run = setup(ctx)
+        run()
+        times = []
+        for _ in range(options.repeat):
+            start = default_timer()
+            run()
+            times.append(default_timer() - start)
+    finally:
+        ctx.cleanup()
+    return OrderedDict([
+        ('n', n),
+        ('unit', unit),
+        ('repeat', options.repeat),
+        ('min', min(times)),
+        ('median', median(times)),
+        ('mean', sum(times) / len(times)),
+        ('max', max(times)),
+        ('ops_per_sec', n / median(times)),
+    ])
+
+
+def git_revision():
+    try:
+        out = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                      stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.decode('ascii').strip()
+
+
+def environment(options):
+    """
+    Describe the environment of a benchmark run, to tell apart results from
+    different versions and machines.
+    """
+    return OrderedDict([
+        ('pyramid_es', pyramid_es.__version__),
+        ('git_revision', git_revision()),
+        ('elasticsearch', '.'.join(map(str, elasticsearch.VERSION))),
+        ('python', sys.version.split()[0]),
+        ('implementation', platform.python_implementation()),
+        ('platform', platform.platform()),
+        ('time', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())),
+        ('serializer', options.serializer),
+        ('scale', options.scale),
+    ])
@@ -0,0 +1,206 @@
+"""
+Run the pyramid_es benchmark suite.
+
+From the root of a source checkout, with pyramid_es installed from it (``pip
+install -e .``)::
+
+    python -m benchmarks.run [-o results.json] [-r 5] [--scale 1.0]
+                             [--serializer json] [benchmark ...]
+
+Requests to ES go to an in-memory fake connection, except for
+``bulk_reindex_http`` which uses a local stub HTTP server, so the results
+measure the client's own overhead. Compare two result files with
+``python -m benchmarks.compare``.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import argparse
+import json
+import sys
+from collections import OrderedDict
+
+import transaction
+
+from pyramid_es.client import ElasticClient
+from pyramid_es.dotdict import DotDict, LazyDotDict
+from pyramid_es.result import ElasticResult
+from pyramid_es.serializer import make_serializer
+from pyramid_es.testing import StubElasticServer
+
+from .fixtures import (Article, FakeConnection, make_articles, make_client,
+                       make_search_response)
+from .harness import BENCHMARKS, benchmark, environment, run_benchmark
+
+
+@benchmark(2000, 'document')
+def mapping_call(ctx):
+    """ESMapping.__call__, walking the mapping tree for each object."""
+    mapping = Article.elastic_mapping()
+    articles = make_articles(ctx.n)
+    return lambda: [mapping(article) for article in articles]
+
+
+@benchmark(2000, 'document')
+def elastic_document(ctx):
+    """ElasticMixin.elastic_document(), with the compiled extractor."""
+    articles = make_articles(ctx.n)
+    return lambda: [article.elastic_document() for article in articles]
+
+
+@benchmark(2000, 'hit')
+def dotdict(ctx):
+    """Eager DotDict conversion of search hits."""
+    hits = make_search_response(ctx.n)['hits']['hits']
+    return lambda: [DotDict(hit) for hit in hits]
+
+
+@benchmark(2000, 'hit')
+def lazy_dotdict(ctx):
+    """LazyDotDict wrapping of search hits, reading a nested field."""
+    hits = make_search_response(ctx.n)['hits']['hits']
+    return lambda: [LazyDotDict(hit)['_source']['author']['name']
+                    for hit in hits]
+
+
+@benchmark(2000, 'hit')
+def result_iterate(ctx):
+    """Iterating over an ElasticResult and reading fields of each record."""
+    raw = make_search_response(ctx.n)
+
+    def run():
+        for record in ElasticResult(raw):
+            record._id, record.title, record.author.name
+    return run
+
+
+@benchmark(2000, 'document')
+def serializer_dumps(ctx):
+    """Encoding documents with the selected serializer, as for bulk writes."""
+    serializer = make_serializer(ctx.options.serializer)
+    docs = [article.elastic_document() for article in make_articles(ctx.n)]
+    return lambda: [serializer.dumps(doc) for doc in docs]
+
+
+@benchmark(2000, 'hit')
+def serializer_loads(ctx):
+    """Decoding a search response with the selected serializer."""
+    serializer = make_serializer(ctx.options.serializer)
+    body = json.dumps(make_search_response(ctx.n))
+    return lambda: serializer.loads(body)
+
+
+@benchmark(1000, 'query')
+def query_compile(ctx):
+    """Building an ElasticQuery and compiling its JSON body."""
+    client = make_client(serializer=ctx.options.serializer)
+
+    def run():
+        for i in range(ctx.n):
+            q = client.query(Article, q='lorem ipsum')
+            q = q.filter_term('tags', 'tag%d' % (i % 7))
+            q = q.filter_terms('author.name', ['Author 1', 'Author 2'])
+            q = q.filter_value_lower('pubdate', '2015-01-01')
+            q = q.order_by('pubdate', desc=True)
+            q = q.add_terms_aggregation('tags', 'tags')
+            q._search_json()
+    return run
+
+
+@benchmark(200, 'search')
+def search_execute(ctx):
+    """Executing a query returning 50 hits, over the fake transport."""
+    client = make_client(serializer=ctx.options.serializer)
+    ctx.add_cleanup(setattr, FakeConnection, 'search_body',
+                    FakeConnection.search_body)
+    FakeConnection.search_body = json.dumps(make_search_response(50))
+    q = client.query(Article).order_by('pubdate').limit(50)
+
+    def run():
+        for _ in range(ctx.n):
+            for record in q.execute():
+                record.title
+    return run
+
+
+@benchmark(1000, 'operation')
+def transaction_commit(ctx):
+    """Queueing index operations in a transaction, and committing them."""
+    client = make_client(serializer=ctx.options.serializer)
+    articles = make_articles(ctx.n)
+
+    def run():
+        transaction.begin()
+        for article in articles:
+            client.index_object(article)
+        transaction.commit()
+    return run
+
+
+@benchmark(5000, 'document')
+def bulk_reindex(ctx):
+    """ElasticClient.reindex_objects() over the fake transport."""
+    client = make_client(serializer=ctx.options.serializer,
+                         use_transaction=False)
+    articles = make_articles(ctx.n)
+    return lambda: client.reindex_objects(articles, workers=4)
+
+
+@benchmark(2000, 'document')
+def bulk_reindex_http(ctx):
+    """ElasticClient.reindex_objects() to a local stub HTTP server."""
+    server = StubElasticServer().start()
+    ctx.add_cleanup(server.stop)
+    client = ElasticClient(servers=[server.host], index='bench',
+                           use_transaction=False,
+                           serializer=ctx.options.serializer)
+    articles = make_articles(ctx.n)
+    return lambda: client.reindex_objects(articles, workers=4)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run the pyramid_es benchmarks.')
+    parser.add_argument('names', nargs='*', metavar='benchmark',
+                        help='benchmarks to run (default: all)')
+    parser.add_argument('-o', '--output',
+                        help='write the results to this JSON file')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='timed runs per benchmark (default: 5)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply the operations per run by this')
+    parser.add_argument('--serializer', default='json',
+                        help='elastic.serializer to use (default: json)')
+    parser.add_argument('-l', '--list', action='store_true',
+                        help='list the benchmarks and exit')
+    options = parser.parse_args(argv)
+
+    if options.list:
+        for name, (setup, n, unit) in BENCHMARKS.items():
+            print('%-20s %s' % (name, setup.__doc__))
+        return 0
+
+    names = options.names or list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error('unknown benchmark(s): %s' % ', '.join(sorted(unknown)))
+
+    results = OrderedDict()
+    print('%-20s %8s %12s %14s' % ('benchmark', 'n', 'median (ms)',
+                                   'ops/sec'))
+    for name in names:
+        result = results[name] = run_benchmark(name, options)
+        print('%-20s %8d %12.2f %14.0f %s' % (
+            name, result['n'], result['median'] * 1000,
+            result['ops_per_sec'], result['unit']))
+        sys.stdout.flush()
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(OrderedDict([('environment', environment(options)),
+                                   ('results', results)]), f, indent=2)
+            f.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
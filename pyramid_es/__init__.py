@@ -1,13 +1,46 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
-from pyramid.settings import asbool
+import six
+from pyramid.settings import asbool, aslist
+from pyramid.tweens import INGRESS
 
+from .cache import ResultCache
 from .client import ElasticClient
+from .instrument import record_event
 
 
 __version__ = '0.3.2.dev'
 
 
+WRITER_SETTINGS = {
+    'workers': int,
+    'queue_size': int,
+    'put_timeout': float,
+    'max_retries': int,
+    'retry_backoff': float,
+    'shutdown_timeout': float,
+}
+
+
+TRANSPORT_SETTINGS = {
+    'maxsize': int,
+    'sniff_on_start': asbool,
+    'sniff_on_connection_fail': asbool,
+    'sniffer_timeout': float,
+    'sniff_timeout': float,
+    'dead_timeout': float,
+    'max_retries': int,
+    'retry_on_timeout': asbool,
+    'compress_min_bytes': int,
+}
+
+
+def _prefixed_options(settings, prefix, converters):
+    return dict((key, convert(settings[prefix + key]))
+                for key, convert in converters.items()
+                if prefix + key in settings)
+
+
 def client_from_config(settings, prefix='elastic.'):
     """
     Instantiate and configure an Elasticsearch from settings.
@@ -16,12 +49,41 @@ def client_from_config(settings, prefix='elastic.'):
     include ``pyramid_es`` and use the :py:func:`get_client` function to get
     access to the shared :py:class:`.client.ElasticClient` instance.
     """
+    writer_options = _prefixed_options(settings, prefix + 'async.',
+                                       WRITER_SETTINGS)
+    transport_options = _prefixed_options(settings, prefix + 'transport.',
+                                          TRANSPORT_SETTINGS)
+
+    servers = settings.get(prefix + 'servers', ['localhost:9200'])
+    if isinstance(servers, six.string_types):
+        servers = aslist(servers)
+
+    cache = None
+    if asbool(settings.get(prefix + 'cache', False)):
+        cache = ResultCache(
+            max_bytes=int(settings.get(prefix + 'cache.max_bytes',
+                                       16 * 1024 * 1024)),
+            default_ttl=float(settings.get(prefix + 'cache.ttl', 60)),
+            write_grace=float(settings.get(prefix + 'cache.write_grace',
+                                           1.0)))
+
     return ElasticClient(
-        servers=settings.get(prefix + 'servers', ['localhost:9200']),
-        timeout=settings.get(prefix + 'timeout', 1.0),
+        servers=servers,
+        timeout=float(settings.get(prefix + 'timeout', 10.0)),
         index=settings[prefix + 'index'],
         use_transaction=asbool(settings.get(prefix + 'use_transaction', True)),
-        disable_indexing=settings.get(prefix + 'disable_indexing', False))
+        disable_indexing=settings.get(prefix + 'disable_indexing', False),
+        bulk_chunk_size=int(settings.get(prefix + 'bulk_chunk_size', 500)),
+        bulk_max_bytes=int(settings.get(prefix + 'bulk_max_bytes',
+                                        10 * 1024 * 1024)),
+        commit_mode=settings.get(prefix + 'commit_mode', 'sync'),
+        writer_options=writer_options,
+        cache=cache,
+        http_compress=asbool(settings.get(prefix + 'http_compress', False)),
+        transport_options=transport_options,
+        trace_sample_rate=float(settings.get(prefix + 'trace.sample_rate',
+                                             1.0)),
+        serializer=settings.get(prefix + 'serializer', 'json'))
 
 
 def includeme(config):
@@ -29,6 +91,10 @@ def includeme(config):
     settings = registry.settings
 
     client = client_from_config(settings)
+    if asbool(settings.get('elastic.instrument')):
+        client.add_listener(record_event)
+        config.add_tween('pyramid_es.instrument.elastic_tween_factory',
+                         under=INGRESS)
     if asbool(settings.get('elastic.ensure_index_on_start')):
         client.ensure_index()
 
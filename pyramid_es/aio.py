@@ -0,0 +1,265 @@
+"""
+asyncio support: an :py:class:`AsyncElasticClient` which runs queries built
+with :py:class:`.query.ElasticQuery` and returns the usual result wrappers,
+over a pooled keep-alive ``aiohttp`` session, so that many searches can run
+concurrently from one event loop.
+
+This module requires Python 3.5.3 or later and ``aiohttp``, installed with the
+``aio`` extra: ``pip install pyramid_es[aio]``.
+"""
+import asyncio
+import itertools
+import logging
+
+from six.moves.urllib.parse import quote
+
+from elasticsearch.exceptions import (ConnectionError, ConnectionTimeout,
+                                      TransportError, HTTP_EXCEPTIONS)
+from elasticsearch.serializer import JSONSerializer
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    raise ImportError('pyramid_es.aio requires aiohttp: install '
+                      'pyramid_es[aio]')
+
+from .bulk import chunk_actions, bulk_errors
+from .client import ElasticClient
+from .exceptions import BulkError
+from .query import ElasticQuery
+from .result import ElasticResult, ElasticResultRecord
+
+log = logging.getLogger(__name__)
+
+
+def _host_url(host):
+    if '://' not in host:
+        host = 'http://' + host
+    return host.rstrip('/')
+
+
+def _encode_param(value):
+    if isinstance(value, (list, tuple)):
+        return ','.join(value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+class AsyncTransport(object):
+    """
+    Send requests to ES over an ``aiohttp`` session, which keeps up to
+    ``maxsize`` keep-alive connections per node. Requests are spread over the
+    nodes round-robin.
+    """
+
+    def __init__(self, hosts, maxsize=10, timeout=10.0, serializer=None):
+        self.hosts = [_host_url(host) for host in hosts]
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.serializer = serializer or JSONSerializer()
+
+        self._next_host = itertools.cycle(self.hosts)
+        self._session = None
+
+    def _get_session(self):
+        # Created lazily so that it binds to the running loop.
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self.maxsize),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def perform_request(self, method, url, params=None, body=None):
+        """
+        Send a request and return the deserialized response body. HTTP
+        errors are raised as the same exceptions the synchronous
+        ``elasticsearch`` client uses.
+        """
+        if params:
+            params = dict((k, _encode_param(v)) for k, v in params.items())
+        if body is not None:
+            body = self.serializer.dumps(body)
+            if not isinstance(body, bytes):
+                body = body.encode('utf-8')
+
+        url = next(self._next_host) + url
+        try:
+            async with self._get_session().request(
+                    method, url, params=params, data=body,
+                    headers={'Content-Type': 'application/json'}) as response:
+                status = response.status
+                data = await response.text('utf-8')
+        except asyncio.TimeoutError as e:
+            raise ConnectionTimeout('TIMEOUT', str(e), e)
+        except aiohttp.ClientError as e:
+            raise ConnectionError('N/A', str(e), e)
+
+        if not 200 <= status < 300:
+            try:
+                info = self.serializer.loads(data)
+                error = info.get('error', data)
+            except Exception:
+                info = error = data
+            exc_class = HTTP_EXCEPTIONS.get(status, TransportError)
+            raise exc_class(status, error, info)
+        if method == 'HEAD' or not data:
+            return None
+        return self.serializer.loads(data)
+
+    async def close(self):
+        """
+        Close the session and its pooled connections.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncElasticQuery(ElasticQuery):
+    """
+    An :py:class:`.query.ElasticQuery` for an :py:class:`AsyncElasticClient`,
+    whose :py:meth:`execute` and :py:meth:`count` are coroutines. Scrolling
+    is not offered: page through results with :py:meth:`execute` and
+    :py:meth:`~.query.ElasticQuery.after` instead.
+    """
+
+    async def execute(self, start=None, size=None, fields=None):
+        """
+        Execute this query and return a result set.
+        """
+        return await self.client.execute(self, start=start, size=size,
+                                         fields=fields)
+
+    async def count(self):
+        """
+        Return the number of documents matching this query.
+        """
+        return await self.client.count(self)
+
+    def scan(self, *args, **kwargs):
+        raise TypeError('Queries of the asyncio client cannot be scrolled: '
+                        'page through them with execute() and after()')
+
+    iter_all = scan
+
+
+class AsyncElasticClient(object):
+    """
+    An asyncio counterpart to :py:class:`.client.ElasticClient` for reading
+    from and bulk writing to the index. Queries are built as usual with
+    :py:meth:`query`, then run with ``await client.execute(q)`` or ``await
+    client.count(q)``, or with ``await q.execute()``. Writes are not
+    transactional.
+    """
+
+    def __init__(self, servers, index, timeout=10.0, maxsize=10,
+                 serializer=None, bulk_chunk_size=500,
+                 bulk_max_bytes=10 * 1024 * 1024):
+        self.index = index
+        self.bulk_chunk_size = bulk_chunk_size
+        self.bulk_max_bytes = bulk_max_bytes
+        self.transport = AsyncTransport(servers, maxsize=maxsize,
+                                        timeout=timeout,
+                                        serializer=serializer)
+
+    @property
+    def serializer(self):
+        return self.transport.serializer
+
+    subtype_names = ElasticClient.subtype_names
+    doc_types = ElasticClient.doc_types
+    _object_document = ElasticClient._object_document
+    _index_object_action = ElasticClient._index_object_action
+    _index_document_action = ElasticClient._index_document_action
+
+    def _path(self, *parts):
+        return '/' + '/'.join(quote(str(part), safe=',')
+                              for part in parts if part)
+
+    def query(self, *classes, **kw):
+        """
+        Return an :py:class:`AsyncElasticQuery` against the specified class.
+        """
+        cls = kw.pop('cls', AsyncElasticQuery)
+        return cls(client=self, classes=classes, **kw)
+
+    async def search(self, body, classes=None, fields=None, **query_params):
+        """
+        Run ES search using default indexes, and return the raw response.
+        """
+        query_params.pop('use_cache', None)
+        query_params.pop('cache_ttl', None)
+        if fields:
+            query_params['fields'] = fields
+        if 'from_' in query_params:
+            query_params['from'] = query_params.pop('from_')
+        path = self._path(self.index, ','.join(self.doc_types(classes)),
+                          '_search')
+        return await self.transport.perform_request('POST', path,
+                                                    params=query_params,
+                                                    body=body)
+
+    async def execute(self, query, start=None, size=None, fields=None):
+        """
+        Execute ``query`` and return a :py:class:`.result.ElasticResult`.
+        """
+        q_start, q_size = query._search_params(start=start, size=size)
+        raw = await self.search(query._search_json(), classes=query.classes,
+                                fields=fields, size=q_size, from_=q_start)
+        return ElasticResult(raw, query._projection(), query._keyset)
+
+    async def count(self, query):
+        """
+        Return the number of documents matching ``query``.
+        """
+        raw = await self.search(query._search_json(), classes=query.classes,
+                                size=0)
+        return raw['hits']['total']
+
+    async def get(self, obj, routing=None):
+        """
+        Retrieve the ES source document for a given object or (document type,
+        id) pair.
+        """
+        if isinstance(obj, tuple):
+            doc_type, doc_id = obj
+        else:
+            doc_type = obj.__class__.__name__
+            doc_id = obj.elastic_document_id()
+            if obj.elastic_parent:
+                routing = obj.elastic_parent
+        params = {'routing': routing} if routing else None
+        raw = await self.transport.perform_request(
+            'GET', self._path(self.index, doc_type, doc_id), params=params)
+        return ElasticResultRecord(raw)
+
+    async def bulk(self, actions, raise_on_error=True):
+        """
+        Execute :py:class:`.bulk.BulkAction` instances with the ``_bulk``
+        API, like :py:meth:`.client.ElasticClient.bulk`.
+        """
+        errors = []
+        for chunk, body in chunk_actions(actions, self.serializer.dumps,
+                                         max_actions=self.bulk_chunk_size,
+                                         max_bytes=self.bulk_max_bytes):
+            response = await self.transport.perform_request(
+                'POST', self._path(self.index, '_bulk'), body=body)
+            errors.extend(bulk_errors(chunk, response))
+        if errors and raise_on_error:
+            raise BulkError(errors)
+        return errors
+
+    async def index_objects(self, objects):
+        """
+        Add or update the indexed documents for multiple objects using the
+        ``_bulk`` API.
+        """
+        return await self.bulk(self._index_object_action(obj)
+                               for obj in objects)
+
+    async def close(self):
+        """
+        Close the pooled connections.
+        """
+        await self.transport.close()
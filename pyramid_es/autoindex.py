@@ -0,0 +1,137 @@
+"""
+Automatic indexing of :py:class:`.mixin.ElasticMixin` objects as they are
+flushed by a SQLAlchemy session.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import weakref
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import RelationshipProperty
+
+from .mixin import ElasticMixin
+
+
+class AutoIndexer(object):
+    """
+    Listen for ``after_flush`` events on SQLAlchemy sessions and index, or
+    delete, the documents for new, modified and deleted
+    :py:class:`.mixin.ElasticMixin` instances using the client's transactional
+    queue.
+
+    Data managers such as zope.sqlalchemy's flush the session when the
+    transaction is already committing, too late to join it. So that the
+    client can still queue the resulting operations, sessions are also
+    flushed by a before-commit hook of the current transaction.
+
+    A modified object is only reindexed if one of the attributes read by its
+    mapping actually changed, according to SQLAlchemy's attribute history. If
+    the mapping reads anything that isn't a mapped column or relationship
+    (such as a Python property), any change to the object's mapped attributes
+    triggers a reindex.
+
+    Usage::
+
+        indexer = AutoIndexer(client)
+        indexer.listen(DBSession)
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._tracked = weakref.WeakKeyDictionary()
+
+    def listen(self, target):
+        """
+        Start indexing objects flushed by ``target``, which may be anything
+        accepting session events: a session, ``sessionmaker``,
+        ``scoped_session`` or ``Session`` class.
+        """
+        event.listen(target, 'after_attach', self.after_attach)
+        event.listen(target, 'after_begin', self.after_begin)
+        event.listen(target, 'after_flush', self.after_flush)
+
+    def remove(self, target):
+        """
+        Stop indexing objects flushed by ``target``.
+        """
+        event.remove(target, 'after_attach', self.after_attach)
+        event.remove(target, 'after_begin', self.after_begin)
+        event.remove(target, 'after_flush', self.after_flush)
+
+    def tracked_attributes(self, cls):
+        """
+        Return the set of mapped attribute names which the document for
+        ``cls`` depends on, or None if a change to any attribute could change
+        the document.
+        """
+        mapping = cls.cached_elastic_mapping()
+        cached = self._tracked.get(cls)
+        if cached is not None and cached[0] is mapping:
+            return cached[1]
+
+        keys = None
+        props = mapping.properties
+        if props is not None and not (mapping.attr or mapping.name or
+                                      mapping.filter):
+            mapper = inspect(cls)
+            keys = set(v.attr or v.name for v in props.values())
+            if cls.__elastic_parent__ is not None:
+                keys.add(cls.__elastic_parent__[1])
+            for key in list(keys):
+                prop = mapper.attrs.get(key)
+                if prop is None:
+                    keys = None
+                    break
+                if isinstance(prop, RelationshipProperty):
+                    # Relationships may change through their foreign key
+                    # columns instead.
+                    keys.update(mapper.get_property_by_column(col).key
+                                for col in prop.local_columns)
+        self._tracked[cls] = (mapping, keys)
+        return keys
+
+    def has_changes(self, obj):
+        """
+        Return True if the document for the modified ``obj`` may have changed
+        since it was loaded.
+        """
+        state = inspect(obj)
+        keys = self.tracked_attributes(obj.__class__)
+        if keys is None:
+            keys = state.mapper.attrs.keys()
+        attrs = state.attrs
+        return any(attrs[key].history.has_changes() for key in keys
+                   if key in attrs)
+
+    def flush_before_commit(self, session):
+        """
+        Flush ``session`` before the current transaction commits, while
+        operations can still be queued in it.
+        """
+        client = self.client
+        if not client.use_transaction:
+            return
+        txn = client.transaction_manager.get()
+        flush = session.flush
+        if not any(hook == flush for hook, args, kws
+                   in txn.getBeforeCommitHooks()):
+            txn.addBeforeCommitHook(flush)
+
+    def after_attach(self, session, instance):
+        if isinstance(instance, ElasticMixin):
+            self.flush_before_commit(session)
+
+    def after_begin(self, session, transaction, connection):
+        self.flush_before_commit(session)
+
+    def after_flush(self, session, flush_context):
+        client = self.client
+        for obj in session.new:
+            if isinstance(obj, ElasticMixin):
+                client.index_object(obj)
+        for obj in session.dirty:
+            if isinstance(obj, ElasticMixin) and self.has_changes(obj):
+                client.index_object(obj)
+        for obj in session.deleted:
+            if isinstance(obj, ElasticMixin):
+                client.delete_object(obj, safe=True)
@@ -0,0 +1,260 @@
+"""
+Utilities for turning write operations into Elasticsearch ``_bulk`` requests.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+
+class BulkAction(object):
+    """
+    A single write operation, in the form it takes inside a ``_bulk`` request
+    body: an action/metadata line, followed by a source line for operations
+    that carry a document.
+    """
+
+    def __init__(self, op_type, index, doc_type, id, source=None,
+                 parent=None, ignore_missing=False, retry_on_conflict=None):
+        self.op_type = op_type
+        self.index = index
+        self.doc_type = doc_type
+        self.id = id
+        self.source = source
+        self.parent = parent
+        self.ignore_missing = ignore_missing
+        self.retry_on_conflict = retry_on_conflict
+
+    def __repr__(self):
+        return '<%s %s %s:%s>' % (self.__class__.__name__, self.op_type,
+                                  self.doc_type, self.id)
+
+    @property
+    def key(self):
+        """
+        The identity of the document this operation applies to, as a
+        ``(doc_type, id, routing)`` tuple.
+        """
+        return self.doc_type, self.id, self.parent
+
+    def meta(self):
+        """
+        Return the action/metadata line for this operation, as a dict.
+        """
+        meta = {
+            '_index': self.index,
+            '_type': self.doc_type,
+            '_id': self.id,
+        }
+        if self.parent:
+            meta['_parent'] = self.parent
+        if self.retry_on_conflict is not None:
+            meta['_retry_on_conflict'] = self.retry_on_conflict
+        return {self.op_type: meta}
+
+    def serialize(self, dumps):
+        """
+        Return the newline-terminated text for this operation in a bulk body,
+        using the supplied ``dumps`` function to encode each line.
+        """
+        lines = [dumps(self.meta())]
+        if self.source is not None:
+            lines.append(dumps(self.source))
+        lines.append('')
+        return '\n'.join(lines)
+
+
+def enqueue_action(queue, action):
+    """
+    Add ``action`` to ``queue``, an ordered dict of pending actions keyed on
+    :py:attr:`BulkAction.key`. Any operation already queued for the same
+    document is superseded, so only the last operation for each document is
+    sent.
+
+    A partial ``update`` is merged into an ``index`` or ``update`` already
+    queued for the same document. An ``update`` of a document queued for
+    deletion becomes an ``index`` of the partial document if it is an upsert,
+    and is otherwise dropped, as it would fail on the deleted document.
+    """
+    previous = queue.pop(action.key, None)
+    if previous is not None:
+        if action.op_type == 'delete':
+            # The superseded operation may have been the one which created
+            # the document, in which case there is nothing in the index to
+            # delete.
+            if previous.op_type != 'delete' or previous.ignore_missing:
+                action.ignore_missing = True
+        elif action.op_type == 'update':
+            action = _merge_update(previous, action)
+    queue[action.key] = action
+
+
+def _merge_doc(target, doc):
+    """
+    Merge the partial document ``doc`` into a copy of ``target`` the way ES
+    applies a partial update: objects are merged recursively, and any other
+    value replaces the one in ``target``.
+    """
+    merged = dict(target)
+    for key, value in doc.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            value = _merge_doc(merged[key], value)
+        merged[key] = value
+    return merged
+
+
+def _merge_update(previous, action):
+    doc = action.source['doc']
+    if previous.op_type == 'index':
+        source = _merge_doc(previous.source, doc)
+        return BulkAction('index', previous.index, previous.doc_type,
+                          previous.id, source=source, parent=previous.parent)
+    if previous.op_type == 'update':
+        source = {'doc': _merge_doc(previous.source['doc'], doc)}
+        if (previous.source.get('doc_as_upsert') or
+                action.source.get('doc_as_upsert')):
+            source['doc_as_upsert'] = True
+        retry_on_conflict = action.retry_on_conflict
+        if retry_on_conflict is None:
+            retry_on_conflict = previous.retry_on_conflict
+        return BulkAction('update', action.index, action.doc_type, action.id,
+                          source=source, parent=action.parent,
+                          retry_on_conflict=retry_on_conflict)
+    if action.source.get('doc_as_upsert'):
+        return BulkAction('index', action.index, action.doc_type, action.id,
+                          source=doc, parent=action.parent)
+    return previous
+
+
+def chunk_actions(actions, dumps, max_actions=500, max_bytes=None):
+    """
+    Split an iterable of :py:class:`BulkAction` instances into chunks that
+    each fit within ``max_actions`` operations and ``max_bytes`` of encoded
+    body. Yields ``(actions, body)`` tuples, where ``body`` is the text to
+    send to the ``_bulk`` endpoint.
+
+    A single action which is larger than ``max_bytes`` is sent in a chunk of
+    its own.
+    """
+    chunk = []
+    lines = []
+    size = 0
+    for action in actions:
+        data = action.serialize(dumps)
+        data_size = len(data.encode('utf-8'))
+        if chunk and (len(chunk) >= max_actions or
+                      (max_bytes and size + data_size > max_bytes)):
+            yield chunk, ''.join(lines)
+            chunk = []
+            lines = []
+            size = 0
+        chunk.append(action)
+        lines.append(data)
+        size += data_size
+    if chunk:
+        yield chunk, ''.join(lines)
+
+
+def bulk_errors(actions, response):
+    """
+    Match the items of a ``_bulk`` response up with the actions that were
+    sent, and return a list of dicts describing each failed operation.
+    """
+    errors = []
+    for action, item in zip(actions, response['items']):
+        result = item[action.op_type]
+        status = result.get('status', 200)
+        if status < 300:
+            continue
+        if status == 404 and action.ignore_missing:
+            continue
+        errors.append({
+            'op_type': action.op_type,
+            'doc_type': action.doc_type,
+            'id': action.id,
+            'status': status,
+            'error': result.get('error'),
+        })
+    return errors
+
+
+def empty_stats():
+    """
+    Return the statistics of a :py:func:`parallel_bulk` call which sent
+    nothing.
+    """
+    return {
+        'chunks': 0,
+        'actions': 0,
+        'bytes': 0,
+        'errors': [],
+        'elapsed': 0.0,
+        'actions_per_second': 0.0,
+    }
+
+
+def parallel_bulk(send, chunks, workers=4, max_in_flight=8, progress=None):
+    """
+    Send ``(actions, body)`` chunks, as produced by :py:func:`chunk_actions`,
+    from a pool of ``workers`` threads. ``send(actions, body)`` must perform
+    the request and return a list of per-item errors.
+
+    At most ``max_in_flight`` chunks are in memory or on the wire at once, so
+    a lazy ``chunks`` iterable is consumed only as fast as ES accepts it. If
+    ``progress`` is supplied, it is called from a worker thread with a
+    snapshot of the statistics after each chunk completes.
+
+    Returns a dict of statistics: ``chunks``, ``actions``, ``bytes``,
+    ``errors`` (a list of per-item errors), ``elapsed`` seconds and
+    ``actions_per_second``. If sending a chunk, or ``progress``, raises, no
+    further chunks are sent and the exception is re-raised once in-flight
+    chunks have finished.
+    """
+    pool = ThreadPool(workers)
+    slots = threading.BoundedSemaphore(max_in_flight)
+    lock = threading.Lock()
+    failures = []
+    start = time.time()
+    stats = empty_stats()
+
+    def snapshot():
+        elapsed = time.time() - start
+        stats['elapsed'] = elapsed
+        stats['actions_per_second'] = elapsed and stats['actions'] / elapsed
+        return dict(stats, errors=list(stats['errors']))
+
+    def run(actions, body):
+        try:
+            errors = send(actions, body)
+        except Exception as e:
+            failures.append(e)
+            slots.release()
+            return
+        with lock:
+            stats['chunks'] += 1
+            stats['actions'] += len(actions)
+            stats['bytes'] += len(body.encode('utf-8'))
+            stats['errors'].extend(errors)
+            current = snapshot()
+        slots.release()
+        if progress:
+            try:
+                progress(current)
+            except Exception as e:
+                failures.append(e)
+
+    try:
+        for actions, body in chunks:
+            slots.acquire()
+            if failures:
+                break
+            pool.apply_async(run, (actions, body))
+        pool.close()
+        pool.join()
+    finally:
+        pool.terminate()
+
+    if failures:
+        raise failures[0]
+    return snapshot()
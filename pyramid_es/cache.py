@@ -0,0 +1,162 @@
+"""
+An in-process cache of search responses, used by
+:py:class:`.client.ElasticClient` when configured with ``cache``.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import six
+
+
+class ResultCache(object):
+    """
+    A thread-safe LRU cache of ES search responses, stored serialized so that
+    callers can't modify a cached entry, and bounded by their total size.
+
+    Entries expire after ``default_ttl`` seconds unless a different TTL is
+    given when they are stored, and are evicted least-recently-used first once
+    the cache grows beyond ``max_bytes``. Each entry records the document
+    types it was searched against, so that writes can invalidate the affected
+    entries with :py:meth:`invalidate`.
+
+    Since ES only makes written documents searchable after the index is
+    refreshed, responses for document types written to in the last
+    ``write_grace`` seconds are not stored: they may not reflect the write
+    yet.
+
+    Note that invalidation only affects the cache of the process performing
+    the write: other processes will see stale results until the entries
+    expire.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, default_ttl=60,
+                 write_grace=1.0, clock=time.time):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.write_grace = write_grace
+        self.clock = clock
+
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+        # key -> (expires, size, doc_types, data)
+        self._entries = OrderedDict()
+        # doc_type -> set of keys. Searches against all types are stored
+        # under None.
+        self._by_type = {}
+        # doc_type -> end of the grace period after the last write. Writes to
+        # all types are recorded under None.
+        self._written = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(doc_types, body, params):
+        """
+        Build a cache key from the parameters of a search request. Dict bodies
+        are canonicalized, string bodies are used as is.
+        """
+        if not isinstance(body, (six.text_type, six.binary_type)):
+            body = json.dumps(body, sort_keys=True, default=str)
+        return (tuple(sorted(doc_types or ())),
+                body,
+                tuple(sorted((k, repr(v)) for k, v in params.items())))
+
+    def get(self, key):
+        """
+        Return the serialized response cached for ``key``, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= self.clock():
+                self._remove(key)
+                self.misses += 1
+                return None
+            # Mark as most recently used.
+            del self._entries[key]
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[3]
+
+    def storable(self, doc_types, ttl=None):
+        """
+        Return True if a response for a search against ``doc_types`` would be
+        stored with the given TTL: it is positive, and none of the types was
+        written to within the last ``write_grace`` seconds.
+        """
+        if ttl is None:
+            ttl = self.default_ttl
+        if ttl <= 0:
+            return False
+        now = self.clock()
+        written = self._written
+        if not doc_types:
+            return all(end <= now for end in list(written.values()))
+        return all(written.get(doc_type, 0) <= now
+                   for doc_type in (None,) + tuple(doc_types))
+
+    def set(self, key, data, doc_types, ttl=None):
+        """
+        Store ``data``, a serialized response, under ``key``. Responses larger
+        than the whole cache, or which aren't :py:meth:`storable`, are not
+        stored.
+        """
+        if ttl is None:
+            ttl = self.default_ttl
+        size = len(data)
+        doc_types = tuple(doc_types or ())
+        if size > self.max_bytes or not self.storable(doc_types, ttl):
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self.clock() + ttl, size, doc_types, data)
+            self.size += size
+            for doc_type in doc_types or (None,):
+                self._by_type.setdefault(doc_type, set()).add(key)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        expires, size, doc_types, data = self._entries.pop(key)
+        self.size -= size
+        for doc_type in doc_types or (None,):
+            keys = self._by_type.get(doc_type)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_type[doc_type]
+
+    def invalidate(self, doc_types=None):
+        """
+        Drop entries for searches which may include any of ``doc_types``:
+        those searching one of the types, and those searching all types. With
+        no argument, drop every entry.
+
+        Responses for these types are then not stored for ``write_grace``
+        seconds.
+        """
+        with self._lock:
+            end = self.clock() + self.write_grace
+            for doc_type in doc_types or (None,):
+                self._written[doc_type] = end
+            if doc_types is None:
+                self._entries.clear()
+                self._by_type.clear()
+                self.size = 0
+                return
+            keys = set()
+            for doc_type in (None,) + tuple(doc_types):
+                keys.update(self._by_type.get(doc_type, ()))
+            for key in keys:
+                self._remove(key)
@@ -1,22 +1,32 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 import logging
+import sys
 
 from itertools import chain
+from collections import OrderedDict
 from pprint import pformat
 from functools import wraps
 
 import six
 
 from elasticsearch import Elasticsearch
-from elasticsearch.exceptions import NotFoundError
+from elasticsearch.exceptions import NotFoundError, TransportError
 
 import transaction as zope_transaction
 from zope.interface import implementer
 from transaction.interfaces import ISavepointDataManager
 
+from .bulk import (BulkAction, enqueue_action, chunk_actions, bulk_errors,
+                   empty_stats, parallel_bulk)
+from .connection import CompressedHttpConnection
+from .exceptions import BulkError, SearchError
+from .instrument import ElasticEvent, Timer, instrumented
+from .trace import start_trace
 from .query import ElasticQuery
-from .result import ElasticResultRecord
+from .result import ElasticResult, ElasticResultRecord
+from .serializer import make_serializer
+from .writer import AsyncWriter
 
 log = logging.getLogger(__name__)
 
@@ -62,64 +72,73 @@ CREATE_INDEX_SETTINGS.update({
     },
 })
 
-STATUS_ACTIVE = 'active'
-STATUS_CHANGED = 'changed'
-
-
-_CLIENT_STATE = {}
-
 
 @implementer(ISavepointDataManager)
 class ElasticDataManager(object):
-    def __init__(self, client, transaction_manager):
+    """
+    Joins a transaction to hold the operations queued by a client during it,
+    and sends them when the transaction commits. There is one data manager
+    per client per transaction, stored as transaction data, so that a client
+    shared between threads keeps a separate queue for each thread's
+    transaction.
+    """
+
+    def __init__(self, client, transaction):
         self.client = client
-        self.transaction_manager = transaction_manager
-        t = transaction_manager.get()
-        t.join(self)
-        _CLIENT_STATE[id(client)] = STATUS_ACTIVE
+        self.transaction = transaction
+        self.trace = start_trace(client.trace_sample_rate)
+        transaction.join(self)
+        transaction.set_data(client, self)
 
         self._reset()
 
     def _reset(self):
-        log.error('_reset(%s)', self)
-        self.client.uncommitted = []
+        self.uncommitted = OrderedDict()
 
     def _finish(self):
-        log.error('_finish(%s)', self)
-        client = self.client
-        del _CLIENT_STATE[id(client)]
+        self.transaction.set_data(self.client, None)
+
+    def _phase(self, name):
+        if self.trace is not None:
+            self.trace.phase(name, len(self.uncommitted))
 
     def abort(self, transaction):
-        log.error('abort(%s)', self)
+        self._phase('abort')
+        if self.trace is not None:
+            self.trace.summary('aborted')
         self._reset()
         self._finish()
 
     def tpc_begin(self, transaction):
-        log.error('tpc_begin(%s)', self)
-        pass
+        self._phase('tpc_begin')
 
     def commit(self, transaction):
-        log.error('commit(%s)', self)
-        pass
+        self._phase('commit')
 
     def tpc_vote(self, transaction):
-        log.error('tpc_vote(%s)', self)
+        self._phase('tpc_vote')
         # XXX Ideally, we'd try to check the uncommitted queue and make sure
         # everything looked ok. Note sure how we can do that, though.
         pass
 
     def tpc_finish(self, transaction):
         # Actually persist the uncommitted queue.
-        log.error('tpc_finish(%s)', self)
-        log.warn("running: %r", self.client.uncommitted)
-        for cmd, args, kwargs in self.client.uncommitted:
-            kwargs['immediate'] = True
-            getattr(self.client, cmd)(*args, **kwargs)
-        self._reset()
-        self._finish()
+        self._phase('tpc_finish')
+        outcome = 'failed'
+        event = None
+        try:
+            event = self.client.commit(self.uncommitted.values())
+            outcome = 'committed'
+        finally:
+            if self.trace is not None:
+                self.trace.summary(outcome, event)
+            self._reset()
+            self._finish()
 
     def tpc_abort(self, transaction):
-        log.error('tpc_abort()')
+        self._phase('tpc_abort')
+        if self.trace is not None:
+            self.trace.summary('aborted')
         self._reset()
         self._finish()
 
@@ -137,26 +156,48 @@ class ElasticSavepoint(object):
 
     def __init__(self, dm):
         self.dm = dm
-        self.saved = dm.client.uncommitted.copy()
+        self.saved = dm.uncommitted.copy()
 
     def rollback(self):
-        self.dm.client.uncommitted = self.saved.copy()
+        self.dm.uncommitted = self.saved.copy()
+
+
+def current_data_manager(client, transaction_manager):
+    """
+    Return the data manager holding the operations queued by ``client`` in
+    the current transaction, or None.
+    """
+    try:
+        return transaction_manager.get().data(client)
+    except KeyError:
+        return None
 
 
 def join_transaction(client, transaction_manager):
-    client_id = id(client)
-    existing_state = _CLIENT_STATE.get(client_id, None)
-    if existing_state is None:
-        log.error('client %s not found, setting up new data manager',
-                  client_id)
-        ElasticDataManager(client, transaction_manager)
-    else:
-        log.error('client %s found, using existing data manager',
-                  client_id)
-        _CLIENT_STATE[client_id] = STATUS_CHANGED
+    """
+    Return the data manager for ``client`` in the current transaction,
+    joining the transaction if necessary.
+    """
+    txn = transaction_manager.get()
+    try:
+        dm = txn.data(client)
+    except KeyError:
+        dm = None
+    if dm is None:
+        dm = ElasticDataManager(client, txn)
+    return dm
 
 
 def transactional(f):
+    """
+    Decorate a client write method so that, when the client is using
+    transactions, the operation is queued until the transaction commits.
+
+    Queued operations are stored as :py:class:`.bulk.BulkAction` instances,
+    built by the client method named ``_<method>_action``, which must accept
+    the same arguments as the decorated method. Only the last operation queued
+    for each document is kept.
+    """
     @wraps(f)
     def transactional_inner(client, *args, **kwargs):
         immediate = kwargs.pop('immediate', None)
@@ -164,10 +205,12 @@ def transactional(f):
             if immediate:
                 return f(client, *args, **kwargs)
             else:
-                log.error('enqueueing action: %s: %r, %r', f.__name__, args,
-                          kwargs)
-                join_transaction(client, client.transaction_manager)
-                client.uncommitted.append((f.__name__, args, kwargs))
+                dm = join_transaction(client, client.transaction_manager)
+                build_action = getattr(client, '_%s_action' % f.__name__)
+                action = build_action(*args, **kwargs)
+                if dm.trace is not None:
+                    dm.trace.op(action)
+                enqueue_action(dm.uncommitted, action)
                 return
         return f(client, *args, **kwargs)
     return transactional_inner
@@ -176,16 +219,88 @@ def transactional(f):
 class ElasticClient(object):
     """
     A handle for interacting with the Elasticsearch backend.
+
+    ``transport_options`` are passed on to the ``elasticsearch`` transport,
+    which hands them on to its connection pool and connections.
+
+    ``serializer`` encodes request bodies and decodes responses: either a
+    serializer instance, or a name accepted by
+    :py:func:`.serializer.make_serializer`.
     """
 
-    def __init__(self, servers, index, timeout=1.0, disable_indexing=False,
+    def __init__(self, servers, index, timeout=10.0, disable_indexing=False,
                  use_transaction=True,
-                 transaction_manager=zope_transaction.manager):
+                 transaction_manager=zope_transaction.manager,
+                 bulk_chunk_size=500, bulk_max_bytes=10 * 1024 * 1024,
+                 commit_mode='sync', writer_options=None, cache=None,
+                 http_compress=False, transport_options=None,
+                 trace_sample_rate=1.0, serializer=None):
         self.index = index
         self.disable_indexing = disable_indexing
         self.use_transaction = use_transaction
         self.transaction_manager = transaction_manager
-        self.es = Elasticsearch(servers)
+        self.bulk_chunk_size = bulk_chunk_size
+        self.bulk_max_bytes = bulk_max_bytes
+        self.trace_sample_rate = trace_sample_rate
+
+        transport_options = dict(transport_options or {})
+        if http_compress:
+            transport_options['connection_class'] = CompressedHttpConnection
+        if isinstance(serializer, six.string_types):
+            serializer = make_serializer(serializer)
+        if serializer is not None:
+            transport_options['serializer'] = serializer
+        self.es = Elasticsearch(servers, timeout=timeout, **transport_options)
+        self.listeners = []
+        self.cache = cache
+
+        if commit_mode == 'async':
+            self.writer = AsyncWriter(self, **(writer_options or {}))
+        elif commit_mode == 'sync':
+            self.writer = None
+        else:
+            raise ValueError('Unknown commit mode: %r' % commit_mode)
+
+    def add_listener(self, listener):
+        """
+        Call ``listener`` with an :py:class:`.instrument.ElasticEvent` after
+        each operation performed by this client. Listeners may be called from
+        any thread.
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Stop calling a listener added with :py:meth:`add_listener`.
+        """
+        self.listeners.remove(listener)
+
+    @property
+    def uncommitted(self):
+        """
+        The operations queued by this client in the current thread's
+        transaction, as an ordered dict of :py:class:`.bulk.BulkAction`
+        instances. Empty outside of a transaction.
+        """
+        dm = current_data_manager(self, self.transaction_manager)
+        if dm is None:
+            return OrderedDict()
+        return dm.uncommitted
+
+    @property
+    def serializer(self):
+        """
+        The serializer used to encode request bodies.
+        """
+        return self.es.transport.serializer
+
+    def close(self):
+        """
+        Flush any operations still queued for background writing and stop the
+        writer threads. Only needed with ``commit_mode='async'``.
+        """
+        if self.writer:
+            self.writer.close()
 
     def ensure_index(self, recreate=False):
         """
@@ -211,7 +326,7 @@ class ElasticClient(object):
         exist.
         """
         doc_type = cls.__name__
-        doc_mapping = cls.elastic_mapping()
+        doc_mapping = cls.cached_elastic_mapping()
 
         doc_mapping = dict(doc_mapping)
         if cls.elastic_parent:
@@ -221,7 +336,8 @@ class ElasticClient(object):
 
         doc_mapping = {doc_type: doc_mapping}
 
-        log.debug('Putting mapping: \n%s', pformat(doc_mapping))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('Putting mapping: \n%s', pformat(doc_mapping))
         if recreate:
             try:
                 self.es.indices.delete_mapping(index=self.index,
@@ -259,20 +375,25 @@ class ElasticClient(object):
                                           doc_type=doc_type)
         return raw[self.index]['mappings']
 
-    def index_object(self, obj, **kw):
-        """
-        Add or update the indexed document for an object.
-        """
+    def _object_document(self, obj):
         doc = obj.elastic_document()
 
         doc_type = obj.__class__.__name__
         doc_id = doc.pop("_id")
         doc_parent = obj.elastic_parent
+        return doc_type, doc_id, doc, doc_parent
 
-        log.debug('Indexing object:\n%s', pformat(doc))
-        log.debug('Type is %r', doc_type)
-        log.debug('ID is %r', doc_id)
-        log.debug('Parent is %r', doc_parent)
+    def index_object(self, obj, **kw):
+        """
+        Add or update the indexed document for an object.
+        """
+        doc_type, doc_id, doc, doc_parent = self._object_document(obj)
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('Indexing object:\n%s', pformat(doc))
+            log.debug('Type is %r', doc_type)
+            log.debug('ID is %r', doc_id)
+            log.debug('Parent is %r', doc_parent)
 
         self.index_document(id=doc_id,
                             doc_type=doc_type,
@@ -280,19 +401,45 @@ class ElasticClient(object):
                             parent=doc_parent,
                             **kw)
 
-    def delete_object(self, obj, safe=False, **kw):
+    def _index_object_action(self, obj):
+        doc_type, doc_id, doc, doc_parent = self._object_document(obj)
+        return self._index_document_action(id=doc_id,
+                                           doc_type=doc_type,
+                                           doc=doc,
+                                           parent=doc_parent)
+
+    def update_object(self, obj, fields=None, doc_as_upsert=False,
+                      retry_on_conflict=None, **kw):
         """
-        Delete the indexed document for an object.
+        Partially update the indexed document for an object, sending only the
+        top-level mapping properties named in ``fields`` (or every property,
+        if not given). With ``doc_as_upsert``, a missing document is created
+        from the partial document. ``retry_on_conflict`` sets how many times
+        ES retries the update when the document changes concurrently.
         """
-        doc = obj.elastic_document()
-
-        doc_type = obj.__class__.__name__
-        doc_id = doc.pop("_id")
-        doc_parent = obj.elastic_parent
+        if fields is None:
+            doc_type, doc_id, doc, doc_parent = self._object_document(obj)
+        else:
+            doc_type = obj.__class__.__name__
+            doc_id = obj.elastic_document_id()
+            doc = obj.elastic_partial_document(fields)
+            doc_parent = obj.elastic_parent
 
-        self.delete_document(id=doc_id,
+        self.update_document(id=doc_id,
                              doc_type=doc_type,
+                             doc=doc,
                              parent=doc_parent,
+                             doc_as_upsert=doc_as_upsert,
+                             retry_on_conflict=retry_on_conflict,
+                             **kw)
+
+    def delete_object(self, obj, safe=False, **kw):
+        """
+        Delete the indexed document for an object.
+        """
+        self.delete_document(id=obj.elastic_document_id(),
+                             doc_type=obj.__class__.__name__,
+                             parent=obj.elastic_parent,
                              safe=safe,
                              **kw)
 
@@ -311,7 +458,52 @@ class ElasticClient(object):
                       id=id)
         if parent:
             kwargs['parent'] = parent
-        self.es.index(**kwargs)
+        event = ElasticEvent('index', [doc_type], count=1)
+        with instrumented(event, self.listeners):
+            with Timer(event, 'request_time'):
+                self.es.index(**kwargs)
+        self._invalidate_cache([doc_type])
+
+    def _index_document_action(self, id, doc_type, doc, parent=None):
+        return BulkAction('index', index=self.index, doc_type=doc_type,
+                          id=id, source=doc, parent=parent)
+
+    @transactional
+    def update_document(self, id, doc_type, doc, parent=None,
+                        doc_as_upsert=False, retry_on_conflict=None):
+        """
+        Merge the fields of ``doc`` into an indexed document, using the ES
+        update API. See :py:meth:`update_object`.
+        """
+        if self.disable_indexing:
+            return
+
+        kwargs = dict(index=self.index,
+                      doc_type=doc_type,
+                      id=id,
+                      body=self._update_source(doc, doc_as_upsert))
+        if parent:
+            kwargs['parent'] = parent
+        if retry_on_conflict is not None:
+            kwargs['retry_on_conflict'] = retry_on_conflict
+        event = ElasticEvent('update', [doc_type], count=1)
+        with instrumented(event, self.listeners):
+            with Timer(event, 'request_time'):
+                self.es.update(**kwargs)
+        self._invalidate_cache([doc_type])
+
+    def _update_document_action(self, id, doc_type, doc, parent=None,
+                                doc_as_upsert=False, retry_on_conflict=None):
+        return BulkAction('update', index=self.index, doc_type=doc_type,
+                          id=id, source=self._update_source(doc,
+                                                            doc_as_upsert),
+                          parent=parent, retry_on_conflict=retry_on_conflict)
+
+    def _update_source(self, doc, doc_as_upsert):
+        source = {'doc': doc}
+        if doc_as_upsert:
+            source['doc_as_upsert'] = True
+        return source
 
     @transactional
     def delete_document(self, id, doc_type, parent=None, safe=False):
@@ -327,19 +519,176 @@ class ElasticClient(object):
                       id=id)
         if parent:
             kwargs['routing'] = parent
+        event = ElasticEvent('delete', [doc_type], count=1)
         try:
-            self.es.delete(**kwargs)
+            with instrumented(event, self.listeners):
+                with Timer(event, 'request_time'):
+                    self.es.delete(**kwargs)
         except NotFoundError:
             if not safe:
                 raise
+        self._invalidate_cache([doc_type])
+
+    def _delete_document_action(self, id, doc_type, parent=None, safe=False):
+        return BulkAction('delete', index=self.index, doc_type=doc_type,
+                          id=id, parent=parent, ignore_missing=safe)
+
+    def bulk(self, actions, raise_on_error=True):
+        """
+        Execute an iterable of :py:class:`.bulk.BulkAction` instances using
+        the ES ``_bulk`` API. Actions are sent in chunks bounded by
+        ``bulk_chunk_size`` operations and ``bulk_max_bytes`` of request body.
+
+        Failures of individual operations do not stop the remaining chunks
+        from being sent. Once all chunks have been sent, a
+        :py:class:`.exceptions.BulkError` describing every failed operation is
+        raised, unless ``raise_on_error`` is False, in which case the list of
+        errors is returned.
+        """
+        if self.disable_indexing:
+            return []
+
+        errors = self._bulk(actions)
+        if errors and raise_on_error:
+            raise BulkError(errors)
+        return errors
+
+    def _bulk(self, actions, event=None):
+        errors = []
+        for chunk, body in chunk_actions(actions, self.serializer.dumps,
+                                         max_actions=self.bulk_chunk_size,
+                                         max_bytes=self.bulk_max_bytes):
+            if event is not None:
+                event.body_bytes += len(body)
+            errors.extend(self._send_bulk(chunk, body))
+        return errors
+
+    def _send_bulk(self, actions, body):
+        doc_types = set(action.doc_type for action in actions)
+        event = ElasticEvent('bulk', sorted(doc_types), count=len(actions))
+        event.body_bytes = len(body)
+        with instrumented(event, self.listeners):
+            with Timer(event, 'request_time'):
+                response = self.es.bulk(body=body, index=self.index)
+            event.took = response.get('took')
+        self._invalidate_cache(doc_types)
+        return bulk_errors(actions, response)
+
+    def commit(self, actions):
+        """
+        Persist the operations of a committed transaction. With
+        ``commit_mode='async'`` they are handed to the background
+        :py:class:`.writer.AsyncWriter`, otherwise they are sent immediately
+        with :py:meth:`bulk`.
+
+        Returns the :py:class:`.instrument.ElasticEvent` describing the
+        commit.
+        """
+        actions = list(actions)
+        doc_types = sorted(set(action.doc_type for action in actions))
+        event = ElasticEvent('commit', doc_types, count=len(actions))
+        with instrumented(event, self.listeners):
+            if self.writer:
+                self.writer.submit(actions)
+            elif not self.disable_indexing:
+                errors = self._bulk(actions, event)
+                if errors:
+                    raise BulkError(errors)
+        return event
 
     def index_objects(self, objects):
         """
-        Add multiple objects to the index.
+        Add multiple objects to the index. To load a large number of objects
+        outside of a transaction, use :py:meth:`reindex_objects` instead.
         """
         for obj in objects:
             self.index_object(obj)
 
+    def reindex_objects(self, objects, chunk_size=None, max_bytes=None,
+                        workers=4, max_in_flight=None, progress=None,
+                        optimize=False, raise_on_error=True):
+        """
+        Index a large number of objects as quickly as possible, bypassing the
+        transaction. ``objects`` may be any iterable, or a SQLAlchemy query,
+        which will be loaded in batches of ``chunk_size`` rows.
+
+        Documents are sent in ``_bulk`` chunks of up to ``chunk_size``
+        operations and ``max_bytes`` of request body (defaulting to the
+        client's bulk settings) over ``workers`` parallel connections, with at
+        most ``max_in_flight`` chunks pending at once. ``progress`` is called
+        with a dict of statistics after each chunk.
+
+        If ``optimize`` is True, index refresh and replicas are disabled while
+        loading, and restored afterwards.
+
+        Returns a dict of statistics, see :py:func:`.bulk.parallel_bulk`.
+        Per-item failures raise a :py:class:`.exceptions.BulkError` once
+        loading has finished, unless ``raise_on_error`` is False.
+        """
+        if self.disable_indexing:
+            return empty_stats()
+
+        chunk_size = chunk_size or self.bulk_chunk_size
+        if hasattr(objects, 'yield_per'):
+            objects = objects.yield_per(chunk_size)
+
+        actions = (self._index_object_action(obj) for obj in objects)
+        chunks = chunk_actions(actions, self.serializer.dumps,
+                               max_actions=chunk_size,
+                               max_bytes=max_bytes or self.bulk_max_bytes)
+
+        if optimize:
+            saved_settings = self._disable_refresh_and_replicas()
+        try:
+            stats = parallel_bulk(self._send_bulk, chunks,
+                                  workers=workers,
+                                  max_in_flight=max_in_flight or workers * 2,
+                                  progress=progress)
+        except Exception:
+            if optimize:
+                exc_info = sys.exc_info()
+                try:
+                    self._restore_settings(saved_settings)
+                except Exception:
+                    log.exception('Failed to restore index settings after '
+                                  'a failed reindex')
+                six.reraise(*exc_info)
+            raise
+        if optimize:
+            self._restore_settings(saved_settings)
+
+        if stats['errors'] and raise_on_error:
+            raise BulkError(stats['errors'])
+        return stats
+
+    def _disable_refresh_and_replicas(self):
+        """
+        Turn off refresh and replicas on the index, and return the settings
+        needed to restore them.
+        """
+        raw = self.es.indices.get_settings(index=self.index)
+        current = raw[self.index]['settings']['index']
+        saved = {
+            'refresh_interval': current.get('refresh_interval', '1s'),
+            'number_of_replicas': current.get('number_of_replicas', 1),
+        }
+        self.es.indices.put_settings(index=self.index, body={
+            'index': {
+                'refresh_interval': '-1',
+                'number_of_replicas': 0,
+            }
+        })
+        return saved
+
+    def _restore_settings(self, saved):
+        """
+        Restore the settings saved by :py:meth:`_disable_refresh_and_replicas`
+        and refresh the index.
+        """
+        self.es.indices.put_settings(index=self.index,
+                                     body={'index': saved})
+        self.refresh()
+
     def flush(self, force=True):
         self.es.indices.flush(force=force)
 
@@ -351,7 +700,8 @@ class ElasticClient(object):
         if isinstance(obj, tuple):
             doc_type, doc_id = obj
         else:
-            doc_type, doc_id = obj.__class__.__name__, obj.id
+            doc_type = obj.__class__.__name__
+            doc_id = obj.elastic_document_id()
             if obj.elastic_parent:
                 routing = obj.elastic_parent
 
@@ -360,8 +710,12 @@ class ElasticClient(object):
                       id=doc_id)
         if routing:
             kwargs['routing'] = routing
-        r = self.es.get(**kwargs)
-        return ElasticResultRecord(r)
+        event = ElasticEvent('get', [doc_type])
+        with instrumented(event, self.listeners):
+            with Timer(event, 'request_time'):
+                r = self.es.get(**kwargs)
+            with Timer(event, 'wrap_time'):
+                return ElasticResultRecord(r)
 
     def refresh(self):
         """
@@ -378,22 +732,128 @@ class ElasticClient(object):
         return [c.__name__ for c in classes
                 if hasattr(c, "elastic_mapping")]
 
-    def search(self, body, classes=None, fields=None, **query_params):
+    def doc_types(self, classes):
         """
-        Run ES search using default indexes.
+        Return the list of document types to query given a sequence of
+        classes or document type names.
         """
-        doc_types = classes and list(chain.from_iterable(
+        return classes and list(chain.from_iterable(
             [doc_type] if isinstance(doc_type, six.string_types) else
             self.subtype_names(doc_type)
-            for doc_type in classes))
+            for doc_type in classes)) or []
 
-        if fields:
-            query_params['fields'] = fields
+    def search(self, body, classes=None, fields=None, use_cache=True,
+               cache_ttl=None, wrap=None, **query_params):
+        """
+        Run ES search using default indexes.
 
-        return self.es.search(index=self.index,
-                              doc_type=','.join(doc_types),
-                              body=body,
-                              **query_params)
+        If the client has a result cache, the response is looked up in and
+        stored to it, unless ``use_cache`` is False. ``cache_ttl`` overrides
+        the default time to live of the stored response. If ``wrap`` is
+        given, it is called with the response and its return value is
+        returned instead.
+        """
+        doc_types = self.doc_types(classes)
+        event = ElasticEvent('search', doc_types)
+        with instrumented(event, self.listeners):
+            if not isinstance(body, six.string_types):
+                with Timer(event, 'serialize_time'):
+                    body = self.serializer.dumps(body)
+            event.body_bytes = len(body)
+            if fields:
+                query_params['fields'] = fields
+
+            use_cache = use_cache and self.cache is not None
+            res = None
+            if use_cache:
+                key = self.cache.make_key(doc_types, body, query_params)
+                data = self.cache.get(key)
+                if data is not None:
+                    event.cached = True
+                    res = self.serializer.loads(data)
+
+            if res is None:
+                with Timer(event, 'request_time'):
+                    res = self.es.search(index=self.index,
+                                         doc_type=','.join(doc_types),
+                                         body=body,
+                                         **query_params)
+                event.took = res.get('took')
+                if use_cache and self.cache.storable(doc_types, cache_ttl):
+                    self.cache.set(key, self.serializer.dumps(res),
+                                   doc_types, ttl=cache_ttl)
+
+            if wrap is not None:
+                with Timer(event, 'wrap_time'):
+                    res = wrap(res)
+            return res
+
+    def _invalidate_cache(self, doc_types):
+        if self.cache is not None:
+            self.cache.invalidate(doc_types)
+
+    def multi_execute(self, *queries, **kw):
+        """
+        Execute several queries in a single ``_msearch`` round trip, and
+        return a list containing one :py:class:`.result.ElasticResult` per
+        query, in order.
+
+        A failure of one query does not affect the others: its place in the
+        list holds a :py:class:`.exceptions.SearchError` instead. Pass
+        ``raise_on_error=True`` to raise the first such error instead.
+        """
+        raise_on_error = kw.pop('raise_on_error', False)
+        if kw:
+            raise TypeError('Unexpected keyword arguments: %r' % list(kw))
+        if not queries:
+            return []
+
+        doc_types = set()
+        body = []
+        for q in queries:
+            header, search_body = q._msearch_request()
+            doc_types.update(header['type'].split(','))
+            body.append(header)
+            body.append(search_body)
+
+        event = ElasticEvent('msearch', sorted(doc_types))
+        with instrumented(event, self.listeners):
+            with Timer(event, 'request_time'):
+                res = self.es.msearch(body=body, index=self.index)
+
+            with Timer(event, 'wrap_time'):
+                results = []
+                for q, response in zip(queries, res['responses']):
+                    if 'error' in response:
+                        results.append(SearchError(response['error']))
+                    else:
+                        results.append(ElasticResult(response,
+                                                     q._projection(),
+                                                     q._keyset))
+
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, SearchError):
+                    raise result
+        return results
+
+    msearch = multi_execute
+
+    def scroll(self, scroll_id, scroll='5m'):
+        """
+        Fetch the next page of results for a scrolled search.
+        """
+        return self.es.scroll(scroll_id=scroll_id, scroll=scroll)
+
+    def clear_scroll(self, scroll_id):
+        """
+        Release the server-side context of a scrolled search. Errors are
+        logged rather than raised, since the context will expire anyway.
+        """
+        try:
+            self.es.clear_scroll(scroll_id=scroll_id)
+        except TransportError:
+            log.warning('Failed to clear scroll %s', scroll_id, exc_info=True)
 
     def query(self, *classes, **kw):
         """
@@ -0,0 +1,54 @@
+"""
+Connection classes for the ``elasticsearch`` transport.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import zlib
+
+import urllib3
+from elasticsearch.connection import Urllib3HttpConnection
+
+
+def gzip_compress(data, level=6):
+    """
+    Return ``data`` compressed in the gzip format.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class _CompressingPool(object):
+    """
+    Wrap a urllib3 connection pool, compressing large request bodies.
+    """
+
+    def __init__(self, pool, min_bytes, level):
+        self.pool = pool
+        self.min_bytes = min_bytes
+        self.level = level
+
+    def urlopen(self, method, url, body=None, headers=None, **kw):
+        if body is not None and len(body) >= self.min_bytes:
+            if not isinstance(body, bytes):
+                body = body.encode('utf-8')
+            body = gzip_compress(body, self.level)
+            headers = dict(headers or {})
+            headers['content-encoding'] = 'gzip'
+        return self.pool.urlopen(method, url, body, headers=headers, **kw)
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+
+class CompressedHttpConnection(Urllib3HttpConnection):
+    """
+    A ``Urllib3HttpConnection`` which gzip-compresses request bodies of at
+    least ``compress_min_bytes``, such as bulk writes, and accepts compressed
+    responses.
+    """
+
+    def __init__(self, compress_min_bytes=1024, compress_level=6, **kwargs):
+        Urllib3HttpConnection.__init__(self, **kwargs)
+        self.headers.update(urllib3.make_headers(accept_encoding=True))
+        self.pool = _CompressingPool(self.pool, compress_min_bytes,
+                                     compress_level)
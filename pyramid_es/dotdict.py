@@ -24,3 +24,46 @@ class DotDict(dict):
 
     def __repr__(self):
         return '<%s(%s)>' % (self.__class__.__name__, dict.__repr__(self))
+
+
+class _LazyList(list):
+    """
+    A list whose dict elements have already been converted to
+    :py:class:`LazyDotDict`.
+    """
+
+
+class LazyDotDict(DotDict):
+    """
+    A DotDict which wraps a source dict without crawling it up front. Sub-dicts
+    (and dicts inside lists) are converted the first time they are accessed,
+    so reading a few keys of a large document only pays for those keys.
+    """
+
+    def __init__(self, d={}):
+        dict.__init__(self, d)
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        cls = value.__class__
+        if cls is dict:
+            value = LazyDotDict(value)
+            dict.__setitem__(self, key, value)
+        elif cls is list:
+            value = _LazyList(LazyDotDict(el) if el.__class__ is dict else el
+                              for el in value)
+            dict.__setitem__(self, key, value)
+        return value
+
+    __getattr__ = __getitem__
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
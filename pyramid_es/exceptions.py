@@ -0,0 +1,40 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+
+class BulkError(Exception):
+    """
+    Raised when one or more operations sent in a ``_bulk`` request failed.
+
+    The ``errors`` attribute is a list with one dict per failed operation,
+    containing the keys ``op_type``, ``doc_type``, ``id``, ``status`` and
+    ``error``.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        Exception.__init__(self, '%d bulk operation(s) failed: %r' %
+                           (len(errors), errors[:5]))
+
+
+class SearchError(Exception):
+    """
+    Describes the failure of a single search within a multi-search request.
+    The ``error`` attribute holds the error reported by ES.
+    """
+
+    def __init__(self, error):
+        self.error = error
+        Exception.__init__(self, error)
+
+
+class ProjectionError(AttributeError):
+    """
+    Raised when reading a field of a result record which its query left out
+    of the ``_source`` with a strict projection.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        AttributeError.__init__(self, 'Field %r was not loaded by the query '
+                                'projection' % key)
@@ -0,0 +1,179 @@
+"""
+Instrumentation of client operations, and a Pyramid tween which totals them
+for each request.
+
+Listeners added with :py:meth:`.client.ElasticClient.add_listener` are called
+with an :py:class:`ElasticEvent` after each search, get, write, bulk request
+and commit.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from pyramid.settings import asbool
+
+log = logging.getLogger(__name__)
+
+
+class ElasticEvent(object):
+    """
+    Describes one client operation. Times are in seconds, except ``took``,
+    which is the time in milliseconds reported by ES.
+
+    ``operation``
+        One of ``search``, ``msearch``, ``get``, ``index``, ``update``,
+        ``delete``, ``bulk`` or ``commit``.
+    ``doc_types``
+        The document types involved.
+    ``body_bytes``
+        Size of the request body, when the client serialized it.
+    ``count``
+        Number of documents written, for ``bulk`` and ``commit``.
+    ``took``
+        Time spent by ES, if reported.
+    ``elapsed``
+        Wall-clock time of the whole operation.
+    ``request_time``
+        Wall-clock time of the HTTP request(s) to ES.
+    ``serialize_time``
+        Time spent encoding the request body.
+    ``wrap_time``
+        Time spent wrapping the response in result objects.
+    ``cached``
+        True if a search was answered from the result cache.
+    ``error``
+        The exception raised by the operation, if any.
+    """
+
+    def __init__(self, operation, doc_types=(), count=None):
+        self.operation = operation
+        self.doc_types = list(doc_types)
+        self.count = count
+        self.body_bytes = 0
+        self.took = None
+        self.elapsed = 0.0
+        self.request_time = 0.0
+        self.serialize_time = 0.0
+        self.wrap_time = 0.0
+        self.cached = False
+        self.error = None
+
+    def __repr__(self):
+        return '<%s %s %s %.1fms>' % (self.__class__.__name__,
+                                      self.operation,
+                                      ','.join(self.doc_types),
+                                      self.elapsed * 1000)
+
+
+class Timer(object):
+    """
+    Accumulate elapsed time on an attribute of an :py:class:`ElasticEvent`.
+    """
+
+    def __init__(self, event, attr):
+        self.event = event
+        self.attr = attr
+
+    def __enter__(self):
+        self.start = time.time()
+
+    def __exit__(self, *exc_info):
+        setattr(self.event, self.attr, getattr(self.event, self.attr) +
+                time.time() - self.start)
+
+
+@contextmanager
+def instrumented(event, listeners):
+    """
+    Time the body of the ``with`` block as ``event.elapsed``, record any
+    exception it raises, then call each of ``listeners`` with ``event``.
+    Exceptions raised by listeners are logged rather than propagated, so they
+    can't break the operation or hide its own error.
+    """
+    start = time.time()
+    try:
+        yield event
+    except Exception as e:
+        event.error = e
+        raise
+    finally:
+        event.elapsed = time.time() - start
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception:
+                log.exception('Error in listener %r for %r', listener, event)
+
+
+class RequestStats(object):
+    """
+    Totals of the client operations made while handling one request: their
+    number (``count``), wall-clock time (``elapsed``) and time spent in
+    requests to ES (``request_time``). All events are kept in ``events``, but
+    ``commit`` events are not counted in the totals, as the bulk requests
+    made by a commit are reported separately.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.count = 0
+        self.elapsed = 0.0
+        self.request_time = 0.0
+
+    def add(self, event):
+        self.events.append(event)
+        if event.operation == 'commit':
+            return
+        self.count += 1
+        self.elapsed += event.elapsed
+        self.request_time += event.request_time
+
+
+_local = threading.local()
+
+
+def current_stats():
+    """
+    Return the :py:class:`RequestStats` for the request being handled by the
+    current thread, or None.
+    """
+    return getattr(_local, 'stats', None)
+
+
+def record_event(event):
+    """
+    A client listener which adds events to :py:func:`current_stats`.
+    """
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.add(event)
+
+
+def elastic_tween_factory(handler, registry):
+    """
+    Collect the client operations made while handling each request into a
+    :py:class:`RequestStats` available as ``request.elastic_stats``. Enabled
+    with the ``elastic.instrument`` setting; if ``elastic.instrument.headers``
+    is also set, the number of operations and their total time in
+    milliseconds are added to the response as ``X-Elastic-Count`` and
+    ``X-Elastic-Time`` headers.
+    """
+    add_headers = asbool(registry.settings.get('elastic.instrument.headers',
+                                               False))
+
+    def elastic_tween(request):
+        stats = request.elastic_stats = _local.stats = RequestStats()
+        try:
+            response = handler(request)
+        finally:
+            _local.stats = None
+        if add_headers:
+            response.headers['X-Elastic-Count'] = str(stats.count)
+            response.headers['X-Elastic-Time'] = '%.1f' % (stats.elapsed *
+                                                           1000)
+        return response
+
+    return elastic_tween
@@ -5,6 +5,19 @@ Utility classes intended to make it easier to specify Elastic Search mappings
 for model objects.
 """
 import copy
+import threading
+import weakref
+from operator import attrgetter
+
+import six
+
+
+# Memoized mappings and compiled document extractors, keyed by class.
+_mappings = weakref.WeakKeyDictionary()
+_extractors = weakref.WeakKeyDictionary()
+_id_extractors = weakref.WeakKeyDictionary()
+_partial_extractors = weakref.WeakKeyDictionary()
+_registry_lock = threading.RLock()
 
 
 class ElasticParent(object):
@@ -40,9 +53,102 @@ class ElasticMixin(object):
         """
         raise NotImplementedError("ES classes must define a mapping")
 
+    @classmethod
+    def cached_elastic_mapping(cls):
+        """
+        Return the ES mapping for the current class, calling
+        :py:meth:`elastic_mapping` only the first time. The returned mapping
+        is shared, so it should be treated as read-only.
+        """
+        mapping = _mappings.get(cls)
+        if mapping is None:
+            with _registry_lock:
+                mapping = _mappings.get(cls)
+                if mapping is None:
+                    mapping = _mappings[cls] = cls.elastic_mapping()
+        return mapping
+
+    @classmethod
+    def invalidate_elastic_mapping(cls):
+        """
+        Forget the memoized mapping and document extractor for the current
+        class and its subclasses, so that they are rebuilt from
+        :py:meth:`elastic_mapping` on next use. Classes whose mapping changes
+        at runtime should call this after each change.
+        """
+        with _registry_lock:
+            for registry in (_mappings, _extractors, _id_extractors,
+                             _partial_extractors):
+                for key in [key for key in registry if issubclass(key, cls)]:
+                    del registry[key]
+
+    @classmethod
+    def elastic_extractor(cls):
+        """
+        Return the compiled form of this class's ES mapping (see
+        :py:meth:`ESMapping.compile`). It is built on first use and then
+        cached for the class.
+        """
+        extractor = _extractors.get(cls)
+        if extractor is None:
+            with _registry_lock:
+                extractor = _extractors.get(cls)
+                if extractor is None:
+                    extractor = cls.cached_elastic_mapping().compile()
+                    _extractors[cls] = extractor
+        return extractor
+
     def elastic_document(self):
         "Apply the class ES mapping to the current instance."
-        return self.elastic_mapping()(self)
+        return self.elastic_extractor()(self)
+
+    def elastic_document_id(self):
+        """
+        Return the ``_id`` of the document for the current instance, without
+        building the rest of the document, unless :py:meth:`elastic_document`
+        is overridden.
+        """
+        if self._overrides_elastic_document():
+            return self.elastic_document()['_id']
+        cls = self.__class__
+        extractor = _id_extractors.get(cls)
+        if extractor is None:
+            with _registry_lock:
+                extractor = _id_extractors.get(cls)
+                if extractor is None:
+                    extractor = cls.cached_elastic_mapping().compile_id()
+                    _id_extractors[cls] = extractor
+        return extractor(self)
+
+    def elastic_partial_document(self, fields):
+        """
+        Apply only the named top-level properties of the class ES mapping to
+        the current instance, returning a partial document without ``_id``.
+        If :py:meth:`elastic_document` is overridden, the named properties are
+        taken from the full document instead.
+        """
+        if self._overrides_elastic_document():
+            doc = self.elastic_document()
+            missing = set(fields) - set(doc)
+            if missing:
+                raise ValueError('Not in the document: %s' %
+                                 ', '.join(sorted(missing)))
+            return dict((name, doc[name]) for name in fields)
+        cls = self.__class__
+        fields = tuple(sorted(fields))
+        extractor = _partial_extractors.get(cls, {}).get(fields)
+        if extractor is None:
+            with _registry_lock:
+                extractors = _partial_extractors.setdefault(cls, {})
+                extractor = extractors.get(fields)
+                if extractor is None:
+                    mapping = cls.cached_elastic_mapping()
+                    extractor = extractors[fields] = mapping.compile(fields)
+        return extractor(self)
+
+    def _overrides_elastic_document(self):
+        return (six.get_unbound_function(self.__class__.elastic_document) is
+                not six.get_unbound_function(ElasticMixin.elastic_document))
 
     elastic_parent = ElasticParent()
 
@@ -139,6 +245,120 @@ class ESMapping(object):
             return instance
         return dict((k, v(instance)) for k, v in self.properties.items())
 
+    def compile(self, fields=None):
+        """
+        Compile this mapping into a function which, applied to an instance,
+        returns the same document as calling the mapping, without walking the
+        mapping tree each time. If ``fields`` is given, the document only
+        contains those top-level properties.
+
+        Properties which are plain attribute reads are fetched together with
+        a single ``operator.attrgetter``. Properties with filters or their own
+        sub-properties are compiled recursively.
+
+        Mappings whose class overrides ``__call__`` are called as they are,
+        rather than compiled.
+
+        The compiled function does not reflect later changes to the mapping.
+        """
+        getter, filter = self._compile_getter()
+        props = self.properties
+        if fields is not None:
+            missing = set(fields) - set(props or ())
+            if missing:
+                raise ValueError('Not mapped properties: %s' %
+                                 ', '.join(sorted(missing)))
+            props = dict((k, props[k]) for k in fields)
+
+        if self._overrides_call():
+            if fields is None:
+                return self
+            keys = tuple(fields)
+            return lambda instance: dict(
+                (k, v) for k, v in self(instance).items() if k in keys)
+
+        if props is None:
+            if filter is None:
+                return getter or (lambda instance: instance)
+            if getter is None:
+                return filter
+            return lambda instance: filter(getter(instance))
+
+        keys = []
+        attrs = []
+        nested = []
+        for k, v in props.items():
+            v_name = v.attr or v.name
+            if (v_name and '.' not in v_name and v.filter is None and
+                    v.properties is None and not v._overrides_call()):
+                keys.append(k)
+                attrs.append(v_name)
+            else:
+                nested.append((k, v.compile()))
+
+        if len(attrs) > 1:
+            fetch = attrgetter(*attrs)
+            keys = tuple(keys)
+
+            def build(instance):
+                return dict(zip(keys, fetch(instance)))
+        elif attrs:
+            fetch = attrgetter(attrs[0])
+            key = keys[0]
+
+            def build(instance):
+                return {key: fetch(instance)}
+        else:
+            def build(instance):
+                return {}
+
+        def extract(instance):
+            if getter is not None:
+                instance = getter(instance)
+            if filter is not None:
+                instance = filter(instance)
+            doc = build(instance)
+            for k, f in nested:
+                doc[k] = f(instance)
+            return doc
+
+        return extract
+
+    def compile_id(self):
+        """
+        Compile a function which returns just the ``_id`` property of the
+        document this mapping produces, reading only the attributes needed
+        for it.
+        """
+        if self._overrides_call():
+            return lambda instance: self(instance)['_id']
+        getter, filter = self._compile_getter()
+        extract_id = self.properties['_id'].compile()
+        if getter is None and filter is None:
+            return extract_id
+
+        def extract(instance):
+            if getter is not None:
+                instance = getter(instance)
+            if filter is not None:
+                instance = filter(instance)
+            return extract_id(instance)
+
+        return extract
+
+    def _compile_getter(self):
+        name = self.attr or self.name
+        if not name:
+            return None, self.filter
+        if '.' in name:
+            # attrgetter would follow the dots, unlike getattr().
+            return (lambda instance: getattr(instance, name)), self.filter
+        return attrgetter(name), self.filter
+
+    def _overrides_call(self):
+        return (six.get_unbound_function(self.__class__.__call__) is not
+                six.get_unbound_function(ESMapping.__call__))
+
 
 class ESProp(ESMapping):
     "A leaf property."
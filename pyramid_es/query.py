@@ -3,12 +3,13 @@ from __future__ import (absolute_import, division, print_function,
 import logging
 
 import copy
-from functools import wraps
+from functools import partial, wraps
 from collections import OrderedDict
 
 import six
 
-from .result import ElasticResult
+from .result import (ElasticResult, ElasticResultRecord, Projection,
+                     decode_cursor)
 
 log = logging.getLogger(__name__)
 
@@ -34,14 +35,29 @@ def filters(f):
     JSON object format.
 
     Should be used inside @generative (listed after in decorator order).
+
+    Filter methods accept a ``cache`` keyword argument, which sets the ES
+    ``_cache`` option of the filter to control whether ES caches its result.
     """
     @wraps(f)
     def wrapped(self, *args, **kwargs):
+        cache = kwargs.pop('cache', None)
         val = f(self, *args, **kwargs)
+        if cache is not None:
+            (filter_type, params), = val.items()
+            val = {filter_type: dict(params, _cache=cache)}
         self.filters.append(val)
     return wrapped
 
 
+def _agg(agg_type, params, aggs):
+    agg = {agg_type: dict((k, v) for k, v in params.items()
+                          if v is not None)}
+    if aggs:
+        agg['aggs'] = aggs
+    return agg
+
+
 class ElasticQuery(object):
     """
     Represents a query to be issued against the ES backend.
@@ -61,9 +77,22 @@ class ElasticQuery(object):
         self.suggests = {}
         self.sorts = OrderedDict()
         self.facets = {}
+        self.aggregations = {}
 
         self._size = None
         self._start = None
+        self._keyset = False
+        self._after = None
+
+        self._source_include = None
+        self._source_exclude = ()
+        self._strict_fields = False
+
+        self._body = None
+        self._body_json = None
+
+        self._use_cache = True
+        self._cache_ttl = None
 
     def _generate(self):
         s = self.__class__.__new__(self.__class__)
@@ -72,6 +101,9 @@ class ElasticQuery(object):
         s.suggests = s.suggests.copy()
         s.sorts = s.sorts.copy()
         s.facets = s.facets.copy()
+        s.aggregations = s.aggregations.copy()
+        s._body = None
+        s._body_json = None
         return s
 
     @staticmethod
@@ -168,6 +200,8 @@ class ElasticQuery(object):
 
         It is recommended to use the helper methods ``add_term_facet()`` or
         ``add_range_facet()`` where possible.
+
+        Facets are deprecated by ES: use :py:meth:`add_aggregation` instead.
         """
         self.facets.update(facet)
 
@@ -204,6 +238,117 @@ class ElasticQuery(object):
             }
         })
 
+    @staticmethod
+    def terms_agg(field, size=10, shard_size=None, order=None,
+                  min_doc_count=None, aggs=None):
+        """
+        Static method to return a ``terms`` aggregation, bucketing documents
+        by the values of ``field``. Only the top ``size`` buckets are
+        returned; ``shard_size`` sets how many candidates each shard sends.
+        ``aggs`` is an optional dict of sub-aggregations to compute for each
+        bucket.
+        """
+        return _agg('terms', {
+            'field': field,
+            'size': size,
+            'shard_size': shard_size,
+            'order': order,
+            'min_doc_count': min_doc_count,
+        }, aggs)
+
+    @staticmethod
+    def range_agg(field, ranges, keyed=None, aggs=None):
+        """
+        Static method to return a ``range`` aggregation. ``ranges`` is a list
+        of dicts with ``from`` and/or ``to`` keys.
+        """
+        return _agg('range', {
+            'field': field,
+            'ranges': ranges,
+            'keyed': keyed,
+        }, aggs)
+
+    @staticmethod
+    def histogram_agg(field, interval, min_doc_count=None, aggs=None):
+        """
+        Static method to return a ``histogram`` aggregation, with buckets of
+        width ``interval``.
+        """
+        return _agg('histogram', {
+            'field': field,
+            'interval': interval,
+            'min_doc_count': min_doc_count,
+        }, aggs)
+
+    @staticmethod
+    def date_histogram_agg(field, interval, format=None, time_zone=None,
+                           min_doc_count=None, aggs=None):
+        """
+        Static method to return a ``date_histogram`` aggregation. ``interval``
+        is an ES date interval like ``'month'`` or ``'1d'``.
+        """
+        return _agg('date_histogram', {
+            'field': field,
+            'interval': interval,
+            'format': format,
+            'time_zone': time_zone,
+            'min_doc_count': min_doc_count,
+        }, aggs)
+
+    @staticmethod
+    def cardinality_agg(field, precision_threshold=None):
+        """
+        Static method to return a ``cardinality`` aggregation, approximately
+        counting the distinct values of ``field``.
+        """
+        return _agg('cardinality', {
+            'field': field,
+            'precision_threshold': precision_threshold,
+        }, None)
+
+    @generative
+    def add_aggregation(self, name, agg):
+        """
+        Add an aggregation named ``name``. ``agg`` is a dict in the format ES
+        uses, such as those returned by :py:meth:`terms_agg` and the other
+        ``*_agg`` static methods, which may contain sub-aggregations. Results
+        are available from :py:attr:`.result.ElasticResult.aggregations`.
+        """
+        self.aggregations[name] = agg
+
+    def add_terms_aggregation(self, name, field, **kw):
+        """
+        Add a ``terms`` aggregation. See :py:meth:`terms_agg`.
+        """
+        return self.add_aggregation(name, self.terms_agg(field, **kw))
+
+    def add_range_aggregation(self, name, field, ranges, **kw):
+        """
+        Add a ``range`` aggregation. See :py:meth:`range_agg`.
+        """
+        return self.add_aggregation(name, self.range_agg(field, ranges, **kw))
+
+    def add_histogram_aggregation(self, name, field, interval, **kw):
+        """
+        Add a ``histogram`` aggregation. See :py:meth:`histogram_agg`.
+        """
+        return self.add_aggregation(name, self.histogram_agg(field, interval,
+                                                             **kw))
+
+    def add_date_histogram_aggregation(self, name, field, interval, **kw):
+        """
+        Add a ``date_histogram`` aggregation. See
+        :py:meth:`date_histogram_agg`.
+        """
+        return self.add_aggregation(
+            name, self.date_histogram_agg(field, interval, **kw))
+
+    def add_cardinality_aggregation(self, name, field, **kw):
+        """
+        Add a ``cardinality`` aggregation. See :py:meth:`cardinality_agg`.
+        """
+        return self.add_aggregation(name, self.cardinality_agg(field, **kw))
+
     @generative
     def add_term_suggester(self, name, field, text, sort='score',
                            suggest_mode='missing'):
@@ -236,20 +381,190 @@ class ElasticQuery(object):
         self._size = n
     size = limit
 
-    def _search(self, start=None, size=None, fields=None):
+    @generative
+    def after(self, cursor):
+        """
+        Use keyset pagination: return the results which sort after the
+        position marked by ``cursor``, a token taken from the
+        :py:attr:`.result.ElasticResult.cursor` of the previous page. Pass
+        None to fetch the first page. Unlike :py:meth:`offset`, the cost of
+        fetching a page does not grow with its depth.
+
+        The results are ordered by the sorts of this query, followed by the
+        document type and id to break ties, and the sort fields should have
+        a value in every document. Sorting on ``_score`` is not supported, as
+        ES cannot filter on it. The tiebreaker sort on ``_uid`` loads its
+        fielddata into the heap of each node. ::
+
+            q = client.query(Article).order_by('pubdate', desc=True).limit(20)
+            page = q.after(None).execute()
+            next_page = q.after(page.cursor).execute()
+        """
+        self._keyset = True
+        self._after = None if cursor is None else decode_cursor(cursor)
+
+    @generative
+    def only(self, *fields):
+        """
+        Only load ``fields`` from the ``_source`` of each result, rather than
+        the whole document. Fields may be dotted paths into object fields,
+        and use ``*`` wildcards. Calling this again adds to the loaded fields;
+        calling it without fields loads no source at all.
+
+        Reading a field which wasn't loaded from a result record returns None,
+        unless :py:meth:`strict` is used.
+        """
+        self._source_include = (self._source_include or ()) + fields
+
+    @generative
+    def exclude(self, *fields):
+        """
+        Leave ``fields`` out of the ``_source`` of each result, like
+        :py:meth:`only`.
+        """
+        self._source_exclude = self._source_exclude + fields
+
+    @generative
+    def strict(self, strict=True):
+        """
+        Raise :py:class:`.exceptions.ProjectionError` when a field left out by
+        :py:meth:`only` or :py:meth:`exclude` is read from a result record,
+        to catch code which relies on it.
+        """
+        self._strict_fields = strict
+
+    def _projection(self):
+        """
+        Return the :py:class:`.result.Projection` of this query, or None.
+        """
+        if self._source_include is None and not self._source_exclude:
+            return None
+        return Projection(self._source_include, self._source_exclude,
+                          self._strict_fields)
+
+    @generative
+    def no_cache(self):
+        """
+        Bypass the client's result cache when executing this query.
+        """
+        self._use_cache = False
+
+    @generative
+    def cache_ttl(self, seconds):
+        """
+        Keep the results of this query in the client's result cache for
+        ``seconds``, rather than the cache's default time to live.
+        """
+        self._cache_ttl = seconds
+
+    def _search_body(self):
+        """
+        Return the request body for this query, excluding pagination. The body
+        is compiled once and cached on this query instance: since queries are
+        generative, any modification produces a new instance with an empty
+        cache. The returned dict must not be modified.
+        """
+        if self._body is None:
+            self._body = self._compile_body()
+        return self._body
+
+    def _search_json(self):
+        """
+        Return the request body for this query serialized to JSON, cached like
+        :py:meth:`_search_body`.
+        """
+        if self._body_json is None:
+            self._body_json = self.client.serializer.dumps(
+                self._search_body())
+        return self._body_json
+
+    def compile_filters(self, filters):
+        """
+        Combine the filters of this query into the single filter sent to ES.
+        Can be overridden in a subclass to customize behavior.
+
+        Filters are combined in a ``bool`` filter, which ES caches per clause
+        and combines as bitsets. Several ``term`` filters on the same field
+        are kept as separate clauses: merging them into a ``terms`` filter
+        with ``and`` execution would build an uncached ``and`` filter.
+        """
+        if len(filters) == 1:
+            return filters[0]
+        return {'bool': {'must': filters}}
+
+    def _keyset_sorts(self):
+        sorts = list(self.sorts.values())
+        for sort in sorts:
+            if '_score' in sort:
+                raise ValueError('Keyset pagination cannot be used with a '
+                                 'sort on _score, which cannot be filtered '
+                                 'on')
+        sorts.append({'_uid': {'order': 'asc'}})
+        return sorts
+
+    def _keyset_filter(self, sorts):
+        """
+        Return a filter for documents which sort after the cursor position.
+        """
+        values = self._after
+        if len(values) != len(sorts):
+            raise ValueError('Cursor does not match the sorts of this query')
+
+        keys = []
+        for sort in sorts:
+            (key, spec), = sort.items()
+            keys.append((key, spec.get('order', 'asc')))
+
+        clauses = []
+        for i, (key, order) in enumerate(keys):
+            op = 'lt' if order == 'desc' else 'gt'
+            clause = [{'term': {k: v}} for (k, _), v in zip(keys[:i], values)]
+            clause.append({'range': {key: {op: values[i]}}})
+            clauses.append(clause[0] if len(clause) == 1 else
+                           {'bool': {'must': clause}})
+        return clauses[0] if len(clauses) == 1 else {'bool': {'should':
+                                                              clauses}}
+
+    def _compile_body(self):
         q = copy.copy(self.base_query)
 
-        if self.filters:
-            f = {'and': self.filters}
+        filters = self.filters
+        sorts = list(self.sorts.values())
+        if self._keyset:
+            sorts = self._keyset_sorts()
+            if self._after is not None:
+                filters = filters + [self._keyset_filter(sorts)]
+
+        if filters:
             q = {
                 'filtered': {
-                    'filter': f,
+                    'filter': self.compile_filters(filters),
                     'query': q,
                 }
             }
 
+        body = {
+            'sort': sorts,
+            'query': q
+        }
+        if self.facets:
+            body['facets'] = self.facets
+        if self.aggregations:
+            body['aggs'] = self.aggregations
+        if self.suggests:
+            body['suggest'] = self.suggests
+        projection = self._projection()
+        if projection is not None:
+            body['_source'] = projection.source_filter()
+        return body
+
+    def _search_params(self, start=None, size=None):
+        """
+        Return the ``(from, size)`` pair to request, combining the offset and
+        limit of this query with those passed to execution.
+        """
         q_start = self._start or 0
-        q_size = self._size or ARBITRARILY_LARGE_SIZE
+        q_size = ARBITRARILY_LARGE_SIZE if self._size is None else self._size
 
         if size is not None:
             q_size = max(0,
@@ -259,24 +574,37 @@ class ElasticQuery(object):
         if start is not None:
             q_start = q_start + start
 
-        body = {
-            'sort': list(self.sorts.values()),
-            'query': q
-        }
-        if self.facets:
-            body['facets'] = self.facets
-        if self.suggests:
-            body['suggest'] = self.suggests
+        return q_start, q_size
 
-        return self.client.search(body, classes=self.classes, fields=fields,
-                                  size=q_size, from_=q_start)
+    def _search(self, start=None, size=None, fields=None, wrap=None):
+        q_start, q_size = self._search_params(start=start, size=size)
+        return self.client.search(self._search_json(), classes=self.classes,
+                                  fields=fields, size=q_size, from_=q_start,
+                                  use_cache=self._use_cache,
+                                  cache_ttl=self._cache_ttl, wrap=wrap)
+
+    def _msearch_request(self, start=None, size=None, fields=None):
+        """
+        Return the ``(header, body)`` pair describing this query in a
+        multi-search request.
+        """
+        q_start, q_size = self._search_params(start=start, size=size)
+        header = {'type': ','.join(self.client.doc_types(self.classes))}
+        body = dict(self._search_body())
+        body['from'] = q_start
+        body['size'] = q_size
+        if fields:
+            body['fields'] = fields
+        return header, body
 
     def execute(self, start=None, size=None, fields=None):
         """
         Execute this query and return a result set.
         """
-        return ElasticResult(self._search(start=start, size=size,
-                                          fields=fields))
+        return self._search(start=start, size=size, fields=fields,
+                            wrap=partial(ElasticResult,
+                                         projection=self._projection(),
+                                         keyset=self._keyset))
 
     def count(self):
         """
@@ -285,3 +613,57 @@ class ElasticQuery(object):
         """
         res = self._search(size=0)
         return res['hits']['total']
+
+    def scan(self, page_size=500, scroll='5m', fields=None):
+        """
+        Iterate over all results of this query without loading them into
+        memory at once. Results are fetched ``page_size`` at a time using the
+        ES scroll API, and yielded lazily as
+        :py:class:`.result.ElasticResultRecord` instances. ``scroll`` is how
+        long ES should keep the scroll context alive between pages.
+
+        If the query is unsorted, the efficient ``scan`` search type is used,
+        in which case ``page_size`` applies per shard. Any offset or limit on
+        the query is honored.
+
+        The scroll context is cleared when iteration finishes, or when the
+        generator is closed early.
+        """
+        start = self._start or 0
+        stop = None if self._size is None else start + self._size
+
+        projection = self._projection()
+        params = {'scroll': scroll, 'size': page_size}
+        scan_type = not (self.sorts or self._keyset)
+        if scan_type:
+            params['search_type'] = 'scan'
+
+        res = self.client.search(self._search_json(), classes=self.classes,
+                                 fields=fields, use_cache=False, **params)
+        scroll_id = res.get('_scroll_id')
+        n = 0
+        try:
+            hits = res['hits']['hits']
+            if scan_type:
+                # The first response of a scan search carries no hits.
+                res = self.client.scroll(scroll_id, scroll=scroll)
+                scroll_id = res.get('_scroll_id', scroll_id)
+                hits = res['hits']['hits']
+            while hits:
+                for hit in hits:
+                    if stop is not None and n >= stop:
+                        return
+                    if n >= start:
+                        yield ElasticResultRecord(hit, projection)
+                    n += 1
+                if not scan_type and len(hits) < page_size:
+                    # A short page of a sorted scroll is the last one.
+                    return
+                res = self.client.scroll(scroll_id, scroll=scroll)
+                scroll_id = res.get('_scroll_id', scroll_id)
+                hits = res['hits']['hits']
+        finally:
+            if scroll_id:
+                self.client.clear_scroll(scroll_id)
+
+    iter_all = scan
@@ -1,15 +1,94 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
-from .dotdict import DotDict
+import base64
+import json
+from fnmatch import fnmatchcase
+
+from pyramid.decorator import reify
+
+from .dotdict import LazyDotDict
+from .exceptions import ProjectionError
+
+
+def encode_cursor(values):
+    """
+    Encode the sort values of a hit as an opaque cursor string.
+    """
+    data = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by :py:func:`encode_cursor`, raising ValueError if
+    it is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(
+            cursor.encode('ascii')).decode('utf-8'))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError('Invalid cursor %r: %s' % (cursor, e))
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor %r' % cursor)
+    return values
+
+
+class Projection(object):
+    """
+    Describes which fields of the ``_source`` were requested by a query, with
+    :py:meth:`.query.ElasticQuery.only` and
+    :py:meth:`.query.ElasticQuery.exclude`. Patterns may use ``*``
+    wildcards, and dotted paths to select parts of an object field.
+    """
+
+    def __init__(self, include=None, exclude=(), strict=False):
+        self.include = include
+        self.exclude = exclude
+        self.strict = strict
+
+    def source_filter(self):
+        """
+        Return the ``_source`` parameter of the search body.
+        """
+        if self.include is not None and not self.include:
+            return False
+        source = {}
+        if self.include:
+            source['include'] = list(self.include)
+        if self.exclude:
+            source['exclude'] = list(self.exclude)
+        return source
+
+    def loaded(self, key):
+        """
+        Return True if the top-level field ``key`` may be present in the
+        ``_source`` of the results, in full or in part.
+        """
+        if any(fnmatchcase(key, pattern) for pattern in self.exclude):
+            return False
+        if self.include is None:
+            return True
+        return any(fnmatchcase(key, pattern.split('.', 1)[0])
+                   for pattern in self.include)
 
 
 class ElasticResultRecord(object):
     """
     Wrapper for an Elasticsearch result record. Provides access to the indexed
     document, ES result data (like score), and the mapped object.
+
+    The raw hit is wrapped in a :py:class:`.dotdict.LazyDotDict`, so nested
+    parts of the document are only converted when they are accessed.
+
+    If the query left fields out of the source with a :py:class:`Projection`,
+    reading one of them as an attribute returns None, or raises
+    :py:class:`.exceptions.ProjectionError` if the projection is strict.
     """
-    def __init__(self, raw):
-        self.raw = DotDict(raw)
+    __slots__ = ('raw', 'projection')
+
+    def __init__(self, raw, projection=None):
+        self.raw = LazyDotDict(raw)
+        self.projection = projection
 
     def __repr__(self):
         return '<%s score:%s id:%s type:%s>' % (
@@ -23,14 +102,25 @@ class ElasticResultRecord(object):
         return key in self.raw
 
     def __getattr__(self, key):
-        source = self.raw.get(u'_source', {})
-        fields = self.raw.get(u'fields', {})
-        if key in source:
-            return source[key]
-        elif key in fields:
-            return fields[key]
-        elif key in self.raw:
-            return self.raw[key]
+        if key in ('raw', 'projection'):
+            # Not yet initialized, e.g. while unpickling.
+            raise AttributeError(key)
+        raw = self.raw
+        if u'_source' in raw:
+            source = raw[u'_source']
+            if key in source:
+                return source[key]
+        if u'fields' in raw:
+            fields = raw[u'fields']
+            if key in fields:
+                return fields[key]
+        if key in raw:
+            return raw[key]
+        projection = self.projection
+        if projection is not None and not projection.loaded(key):
+            if projection.strict:
+                raise ProjectionError(key)
+            return None
         raise AttributeError('%r object has no attribute %r' %
                              (self.__class__.__name__, key))
 
@@ -41,13 +131,18 @@ class ElasticResult(object):
     result aggregate data (like total count), and facets.
 
     Iterate over this object to yield document records, which are instances of
-    :py:class:`ElasticResultRecord`.
+    :py:class:`ElasticResultRecord`. ``projection`` is the
+    :py:class:`Projection` of the query, if any, and ``keyset`` is True if it
+    used keyset pagination.
     """
-    def __init__(self, raw):
+    def __init__(self, raw, projection=None, keyset=False):
         self.raw = raw
+        self.projection = projection
+        self.keyset = keyset
 
     def __iter__(self):
-        return (ElasticResultRecord(record)
+        projection = self.projection
+        return (ElasticResultRecord(record, projection)
                 for record in self.raw['hits']['hits'])
 
     def __repr__(self):
@@ -63,6 +158,31 @@ class ElasticResult(object):
         """
         return self.raw['hits']['total']
 
+    @property
+    def cursor(self):
+        """
+        Return an opaque token marking the position after the last record of
+        this result set, to pass to :py:meth:`.query.ElasticQuery.after` to
+        fetch the next page. None if there are no records, or if the query
+        did not use :py:meth:`~.query.ElasticQuery.after`.
+        """
+        if not self.keyset:
+            return None
+        hits = self.raw['hits']['hits']
+        if not hits or 'sort' not in hits[-1]:
+            return None
+        return encode_cursor(hits[-1]['sort'])
+
+    @reify
+    def aggregations(self):
+        """
+        Return the aggregations computed by this search query, as a
+        :py:class:`.dotdict.LazyDotDict`: buckets are only converted when
+        they are accessed, e.g. ``result.aggregations.genres.buckets``. The
+        wrapper is built once, so converted buckets are kept.
+        """
+        return LazyDotDict(self.raw.get('aggregations', {}))
+
     @property
     def facets(self):
         """
@@ -0,0 +1,117 @@
+"""
+Serializers for the ``elasticsearch`` transport, backed by faster JSON
+libraries when they are installed. Select one with the ``elastic.serializer``
+setting: ``json`` (the default), ``orjson``, ``ujson``, or ``auto`` for the
+fastest one available.
+
+All of them encode the values emitted by mappings of SQLAlchemy columns like
+the stdlib serializer does: dates and datetimes in ISO 8601 format, and
+``Decimal`` values as floats. Strings are passed through unchanged, as they
+are already serialized bodies.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import logging
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+
+import six
+from elasticsearch.exceptions import SerializationError
+from elasticsearch.serializer import JSONSerializer
+
+log = logging.getLogger(__name__)
+
+
+def _default(data):
+    if isinstance(data, date):
+        return data.isoformat()
+    if isinstance(data, Decimal):
+        return float(data)
+    raise TypeError('Unable to serialize %r (type: %s)' % (data, type(data)))
+
+
+class OrjsonSerializer(JSONSerializer):
+    """
+    Serialize with ``orjson``. Anything it can't encode, such as integers
+    beyond 64 bits, is handed to the stdlib serializer instead.
+    """
+
+    def __init__(self):
+        import orjson
+        self.orjson = orjson
+        self.option = orjson.OPT_NON_STR_KEYS
+
+    def loads(self, s):
+        try:
+            return self.orjson.loads(s)
+        except ValueError as e:
+            raise SerializationError(s, e)
+
+    def dumps(self, data):
+        if isinstance(data, six.string_types):
+            return data
+        try:
+            return self.orjson.dumps(data, default=_default,
+                                     option=self.option).decode('utf-8')
+        except TypeError:
+            return JSONSerializer.dumps(self, data)
+
+
+class UjsonSerializer(JSONSerializer):
+    """
+    Serialize with ``ujson``. Anything it can't encode is handed to the stdlib
+    serializer instead.
+    """
+
+    def __init__(self):
+        import ujson
+        self.ujson = ujson
+
+    def loads(self, s):
+        try:
+            return self.ujson.loads(s)
+        except ValueError as e:
+            raise SerializationError(s, e)
+
+    def dumps(self, data):
+        if isinstance(data, six.string_types):
+            return data
+        try:
+            return self.ujson.dumps(data, ensure_ascii=False,
+                                    escape_forward_slashes=False,
+                                    default=_default)
+        except (TypeError, OverflowError):
+            return JSONSerializer.dumps(self, data)
+
+
+SERIALIZERS = OrderedDict([
+    ('orjson', OrjsonSerializer),
+    ('ujson', UjsonSerializer),
+    ('json', JSONSerializer),
+])
+
+
+def make_serializer(name='json'):
+    """
+    Return an instance of the serializer called ``name`` in
+    :py:data:`SERIALIZERS`, or of the first one available for ``auto``. If
+    the library for the requested serializer isn't installed, a warning is
+    logged and the stdlib serializer is used instead.
+    """
+    if name == 'auto':
+        for cls in SERIALIZERS.values():
+            try:
+                return cls()
+            except ImportError:
+                pass
+    try:
+        cls = SERIALIZERS[name]
+    except KeyError:
+        raise ValueError('Unknown serializer: %r' % name)
+    try:
+        return cls()
+    except ImportError:
+        log.warning('%s is not installed, falling back to the json '
+                    'serializer', name)
+        return JSONSerializer()
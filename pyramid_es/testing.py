@@ -0,0 +1,163 @@
+"""
+Testing helpers. :py:class:`StubElasticServer` is a tiny in-memory stand-in
+for an Elasticsearch HTTP server, good enough to exercise the transport layer
+in tests and benchmarks without a real ES server: documents can be written
+with ``_bulk``, fetched by id, and listed with ``_search``. The number of
+requests handled concurrently is tracked in ``max_active``.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import json
+import threading
+import time
+import zlib
+
+from six.moves.BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from six.moves.socketserver import ThreadingMixIn
+from six.moves.urllib.parse import urlparse, parse_qs
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        server = self.server
+        server.record(self)
+        try:
+            self._respond(server)
+        finally:
+            server.record_done()
+
+    def _respond(self, server):
+        if server.delay:
+            time.sleep(server.delay)
+
+        url = urlparse(self.path)
+        params = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        parts = [part for part in url.path.split('/') if part]
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        body = body.decode('utf-8')
+
+        if parts[-1] == '_bulk':
+            return self._send(200, server.bulk(body))
+        if parts[-1] == '_search':
+            doc_types = parts[1].split(',') if len(parts) > 2 else []
+            return self._send(200, server.search(doc_types, params))
+        if len(parts) == 3 and self.command == 'GET':
+            index, doc_type, doc_id = parts
+            doc = server.docs.get((doc_type, doc_id))
+            if doc is None:
+                return self._send(404, {'_index': index, '_type': doc_type,
+                                        '_id': doc_id, 'found': False})
+            return self._send(200, {'_index': index, '_type': doc_type,
+                                    '_id': doc_id, '_version': 1,
+                                    'found': True, '_source': doc})
+        self._send(400, {'error': 'Unsupported request %s %s' %
+                         (self.command, self.path), 'status': 400})
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+
+class StubElasticServer(ThreadingMixIn, HTTPServer):
+    """
+    Serve on an ephemeral localhost port from a background thread. Use
+    :py:attr:`host` as the ES server address.
+    """
+    daemon_threads = True
+
+    def __init__(self, delay=0):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        self.delay = delay
+        self.docs = {}
+        self.requests = []
+        self.headers = []
+        self.connections = set()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def host(self):
+        return '%s:%d' % self.server_address
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        kwargs={'poll_interval': 0.01})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def record(self, handler):
+        with self._lock:
+            self.requests.append((handler.command, handler.path))
+            self.headers.append(dict((k.lower(), v)
+                                     for k, v in handler.headers.items()))
+            self.connections.add(handler.client_address)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def record_done(self):
+        with self._lock:
+            self.active -= 1
+
+    def bulk(self, body):
+        lines = [json.loads(line) for line in body.splitlines() if line]
+        items = []
+        with self._lock:
+            while lines:
+                (op_type, meta), = lines.pop(0).items()
+                key = (meta['_type'], str(meta['_id']))
+                result = {'_index': meta['_index'], '_type': meta['_type'],
+                          '_id': meta['_id'], 'status': 200}
+                if op_type == 'delete':
+                    if self.docs.pop(key, None) is None:
+                        result['status'] = 404
+                elif op_type == 'update':
+                    partial = lines.pop(0)
+                    if key in self.docs:
+                        self.docs[key].update(partial['doc'])
+                    elif partial.get('doc_as_upsert'):
+                        self.docs[key] = partial['doc']
+                    else:
+                        result['status'] = 404
+                        result['error'] = 'DocumentMissingException'
+                else:
+                    self.docs[key] = lines.pop(0)
+                    result['status'] = 201
+                items.append({op_type: result})
+        return {'took': 1,
+                'errors': any(list(item.values())[0]['status'] >= 300
+                              for item in items),
+                'items': items}
+
+    def search(self, doc_types, params):
+        with self._lock:
+            hits = [{'_index': 'stub', '_type': doc_type, '_id': doc_id,
+                     '_score': 1.0, '_source': doc}
+                    for (doc_type, doc_id), doc in sorted(self.docs.items())
+                    if not doc_types or doc_type in doc_types]
+        start = int(params.get('from', 0))
+        size = int(params.get('size', 10))
+        return {'took': 1, 'timed_out': False,
+                '_shards': {'total': 1, 'successful': 1, 'failed': 0},
+                'hits': {'total': len(hits), 'max_score': 1.0,
+                         'hits': hits[start:start + size]}}
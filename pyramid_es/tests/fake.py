@@ -0,0 +1,84 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import json
+
+from ..client import ElasticClient
+
+
+class FakeSerializer(object):
+    def dumps(self, data):
+        return json.dumps(data, sort_keys=True)
+
+    def loads(self, s):
+        return json.loads(s)
+
+
+class FakeTransport(object):
+    serializer = FakeSerializer()
+
+
+class FakeIndices(object):
+
+    def __init__(self, index):
+        self.settings = {index: {'settings': {'index': {
+            'number_of_replicas': '1',
+        }}}}
+        self.put_settings_calls = []
+        self.refreshed = 0
+
+    def get_settings(self, index):
+        return self.settings
+
+    def put_settings(self, index, body):
+        self.put_settings_calls.append(body)
+        self.settings[index]['settings']['index'].update(body['index'])
+
+    def refresh(self, index):
+        self.refreshed += 1
+
+
+class FakeES(object):
+    """
+    Stand-in for ``elasticsearch.Elasticsearch`` which records bulk requests
+    and answers them with a configurable per-item status.
+    """
+
+    def __init__(self, statuses=None):
+        self.transport = FakeTransport()
+        self.indices = FakeIndices('pyramid_es_tests_bulk')
+        self.bulk_bodies = []
+        self.statuses = statuses or {}
+        self.search_calls = []
+        self.search_response = {'took': 1,
+                                'hits': {'total': 0, 'hits': []}}
+
+    def search(self, index=None, doc_type=None, body=None, **params):
+        self.search_calls.append((doc_type, body, params))
+        return self.search_response
+
+    def bulk(self, body, index=None):
+        self.bulk_bodies.append(body)
+        lines = [json.loads(line) for line in body.splitlines()]
+        items = []
+        errors = False
+        for line in lines:
+            if len(line) != 1:
+                continue
+            (op_type, meta), = line.items()
+            if op_type not in ('index', 'delete', 'update'):
+                continue
+            status = self.statuses.get(meta['_id'], 200)
+            result = {'_id': meta['_id'], 'status': status}
+            if status >= 300:
+                result['error'] = 'Failure %d' % status
+                errors = True
+            items.append({op_type: result})
+        return {'items': items, 'errors': errors}
+
+
+def make_client(**kw):
+    client = ElasticClient(servers=['localhost:9200'],
+                           index='pyramid_es_tests_bulk',
+                           **kw)
+    client.es = FakeES()
+    return client
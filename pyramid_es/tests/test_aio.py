@@ -0,0 +1,93 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import sys
+from unittest import TestCase, skipIf
+
+from elasticsearch.exceptions import NotFoundError
+
+from ..bulk import BulkAction
+from ..testing import StubElasticServer
+
+from .data import Genre
+
+try:
+    import asyncio
+    from ..aio import AsyncElasticClient
+except (ImportError, SyntaxError):
+    AsyncElasticClient = None
+
+
+@skipIf(AsyncElasticClient is None or sys.version_info < (3, 5, 3),
+        'asyncio support requires Python 3.5.3 and aiohttp')
+class TestAsyncClient(TestCase):
+
+    def setUp(self):
+        self.server = StubElasticServer().start()
+        self.addCleanup(self.server.stop)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(asyncio.set_event_loop, None)
+        self.addCleanup(self.loop.close)
+        self.client = AsyncElasticClient(servers=[self.server.host],
+                                         index='pyramid_es_tests_aio',
+                                         maxsize=4)
+        self.addCleanup(lambda: self.run_async(self.client.close()))
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def _index_genres(self, n):
+        genres = [Genre(title='Genre %d' % i) for i in range(n)]
+        self.run_async(self.client.index_objects(genres))
+        return genres
+
+    def test_execute(self):
+        self._index_genres(5)
+        q = self.client.query(Genre).limit(3)
+        result = self.run_async(self.client.execute(q))
+        self.assertEqual(result.total, 5)
+        self.assertEqual(len(list(result)), 3)
+        method, path = self.server.requests[-1]
+        self.assertEqual(method, 'POST')
+        self.assertIn('/pyramid_es_tests_aio/Genre/_search?', path)
+
+    def test_query_methods(self):
+        self._index_genres(4)
+        q = self.client.query(Genre).limit(2)
+        result = self.run_async(q.execute())
+        self.assertEqual(len(list(result)), 2)
+        self.assertEqual(self.run_async(q.count()), 4)
+        with self.assertRaises(TypeError):
+            q.scan()
+
+    def test_count(self):
+        self._index_genres(7)
+        q = self.client.query(Genre)
+        self.assertEqual(self.run_async(self.client.count(q)), 7)
+
+    def test_get(self):
+        genre, = self._index_genres(1)
+        record = self.run_async(self.client.get(genre))
+        self.assertEqual(record.title, 'Genre 0')
+        with self.assertRaises(NotFoundError):
+            self.run_async(self.client.get(('Genre', 'nope')))
+
+    def test_bulk_errors(self):
+        result = self.run_async(self.client.bulk(
+            [BulkAction('delete', 'pyramid_es_tests_aio', 'Genre', 'nope'),
+             BulkAction('delete', 'pyramid_es_tests_aio', 'Genre', 'gone',
+                        ignore_missing=True)],
+            raise_on_error=False))
+        self.assertEqual([err['id'] for err in result], ['nope'])
+
+    def test_concurrent_searches_share_pool(self):
+        self._index_genres(3)
+        self.server.delay = 0.05
+        q = self.client.query(Genre)
+        results = self.run_async(asyncio.gather(*[self.client.execute(q)
+                                                  for n in range(12)]))
+        self.assertEqual([r.total for r in results], [3] * 12)
+        # Searches ran concurrently, over at most four connections.
+        self.assertGreater(self.server.max_active, 1)
+        self.assertLessEqual(self.server.max_active, 4)
+        self.assertLessEqual(len(self.server.connections), 4)
@@ -0,0 +1,144 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import json
+from unittest import TestCase
+
+import transaction
+from sqlalchemy import Column, create_engine, types, orm
+from sqlalchemy.ext.declarative import declarative_base
+
+from ..autoindex import AutoIndexer
+from ..mixin import ElasticMixin, ESMapping, ESString
+
+from .data import Base as DataBase, Genre, Movie
+from .fake import make_client
+
+
+Base = declarative_base()
+
+
+class Note(Base, ElasticMixin):
+    __tablename__ = 'notes'
+    id = Column(types.Integer, primary_key=True)
+    title = Column(types.Unicode(40))
+    internal = Column(types.Unicode(40))
+
+    @classmethod
+    def elastic_mapping(cls):
+        return ESMapping(
+            properties=ESMapping(
+                ESString('title')))
+
+
+class FlushingDataManager(object):
+    """
+    Flush a session in ``tpc_begin``, like zope.sqlalchemy does.
+    """
+    transaction_manager = transaction.manager
+
+    def __init__(self, session):
+        self.session = session
+
+    def tpc_begin(self, txn):
+        self.session.flush()
+
+    def abort(self, txn):
+        pass
+
+    commit = tpc_vote = tpc_finish = tpc_abort = abort
+
+    def sortKey(self):
+        return 'flushing'
+
+
+class TestAutoIndexer(TestCase):
+
+    def setUp(self):
+        self.client = make_client()
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        DataBase.metadata.create_all(engine)
+        self.session = orm.Session(engine)
+        self.addCleanup(self.session.close)
+        self.indexer = AutoIndexer(self.client)
+        self.indexer.listen(self.session)
+
+    def _sent(self):
+        return [json.loads(line) for body in self.client.es.bulk_bodies
+                for line in body.splitlines()]
+
+    def _flush(self, *objs):
+        with transaction.manager:
+            self.session.add_all(objs)
+            self.session.flush()
+        self.session.commit()
+        sent = self._sent()
+        self.client.es.bulk_bodies = []
+        return sent
+
+    def test_tracked_attributes(self):
+        self.assertEqual(self.indexer.tracked_attributes(Note),
+                         set(['id', 'title']))
+        # genre_title is a plain property.
+        self.assertIsNone(self.indexer.tracked_attributes(Movie))
+
+    def test_new_dirty_deleted(self):
+        note = Note(id=1, title='Hello', internal='x')
+        self.assertEqual(self._flush(note), [
+            {'index': {'_index': self.client.index, '_type': 'Note',
+                       '_id': 1}},
+            {'title': 'Hello'},
+        ])
+
+        note.internal = 'y'
+        self.assertEqual(self._flush(), [])
+
+        # Setting a loaded attribute to the same value is not a change.
+        self.assertEqual(note.title, 'Hello')
+        note.title = 'Hello'
+        self.assertEqual(self._flush(), [])
+
+        note.title = 'Goodbye'
+        self.assertEqual(self._flush(), [
+            {'index': {'_index': self.client.index, '_type': 'Note',
+                       '_id': 1}},
+            {'title': 'Goodbye'},
+        ])
+
+        self.session.delete(note)
+        self.assertEqual(self._flush(), [
+            {'delete': {'_index': self.client.index, '_type': 'Note',
+                        '_id': 1}},
+        ])
+
+    def test_untracked_mapping(self):
+        genre = Genre(title='Drama')
+        movie = Movie(title='Jaws', director='Spielberg', genre=genre)
+        sent = self._flush(genre, movie)
+        self.assertEqual(len(sent), 4)
+
+        movie.year = 1975
+        sent = self._flush()
+        self.assertEqual(sent[1]['year'], 1975)
+
+    def test_flush_at_commit(self):
+        with transaction.manager as txn:
+            txn.join(FlushingDataManager(self.session))
+            self.session.add(Note(id=1, title='Hello'))
+        self.assertEqual(self._sent(), [
+            {'index': {'_index': self.client.index, '_type': 'Note',
+                       '_id': 1}},
+            {'title': 'Hello'},
+        ])
+        self.assertEqual(self.session.query(Note).count(), 1)
+        self.session.commit()
+
+        with transaction.manager as txn:
+            txn.join(FlushingDataManager(self.session))
+            note = self.session.query(Note).one()
+            note.title = 'Goodbye'
+        self.assertEqual(self._sent()[-1], {'title': 'Goodbye'})
+
+    def test_remove(self):
+        self.indexer.remove(self.session)
+        self.assertEqual(self._flush(Note(id=1, title='Hello')), [])
@@ -0,0 +1,425 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import json
+import threading
+import time
+from unittest import TestCase
+
+import transaction
+from elasticsearch.exceptions import ConnectionError
+
+from ..bulk import BulkAction, chunk_actions, bulk_errors
+from ..exceptions import BulkError
+from ..mixin import ElasticMixin, ESMapping, ESString
+
+from .data import Genre, Movie
+from .fake import make_client
+
+
+class Page(ElasticMixin):
+
+    def __init__(self, id, slug, title):
+        self.id = id
+        self.slug = slug
+        self.title = title
+
+    @classmethod
+    def elastic_mapping(cls):
+        return ESMapping(properties=ESMapping(ESString('title')))
+
+    def elastic_document(self):
+        doc = ElasticMixin.elastic_document(self)
+        doc['_id'] = self.slug
+        doc['title'] = doc['title'].upper()
+        return doc
+
+
+class TestChunkActions(TestCase):
+
+    def _make_actions(self, n):
+        return [BulkAction('index', index='idx', doc_type='Thing', id=i,
+                           source={'name': 'thing %d' % i})
+                for i in range(n)]
+
+    def test_chunk_by_count(self):
+        actions = self._make_actions(7)
+        chunks = list(chunk_actions(actions, json.dumps, max_actions=3))
+        self.assertEqual([len(chunk) for chunk, body in chunks], [3, 3, 1])
+
+    def test_chunk_by_bytes(self):
+        actions = self._make_actions(4)
+        size = len(actions[0].serialize(json.dumps))
+        chunks = list(chunk_actions(actions, json.dumps, max_actions=100,
+                                    max_bytes=size * 2))
+        self.assertEqual([len(chunk) for chunk, body in chunks], [2, 2])
+
+    def test_oversized_action(self):
+        actions = self._make_actions(2)
+        chunks = list(chunk_actions(actions, json.dumps, max_bytes=1))
+        self.assertEqual([len(chunk) for chunk, body in chunks], [1, 1])
+
+    def test_body_format(self):
+        actions = [BulkAction('index', index='idx', doc_type='Thing', id=1,
+                              source={'a': 1}, parent=7),
+                   BulkAction('delete', index='idx', doc_type='Thing', id=2)]
+        (chunk, body), = chunk_actions(actions, json.dumps)
+        lines = body.split('\n')
+        self.assertEqual(lines[-1], '')
+        self.assertEqual(json.loads(lines[0]),
+                         {'index': {'_index': 'idx', '_type': 'Thing',
+                                    '_id': 1, '_parent': 7}})
+        self.assertEqual(json.loads(lines[1]), {'a': 1})
+        self.assertEqual(json.loads(lines[2]),
+                         {'delete': {'_index': 'idx', '_type': 'Thing',
+                                     '_id': 2}})
+        self.assertEqual(len(lines), 4)
+
+
+class TestBulkErrors(TestCase):
+
+    def test_errors(self):
+        actions = [BulkAction('index', 'idx', 'Thing', 1, source={}),
+                   BulkAction('delete', 'idx', 'Thing', 2),
+                   BulkAction('delete', 'idx', 'Thing', 3,
+                              ignore_missing=True)]
+        response = {'items': [
+            {'index': {'_id': 1, 'status': 400, 'error': 'Bad'}},
+            {'delete': {'_id': 2, 'status': 404}},
+            {'delete': {'_id': 3, 'status': 404}},
+        ]}
+        errors = bulk_errors(actions, response)
+        self.assertEqual([err['id'] for err in errors], [1, 2])
+        self.assertEqual(errors[0]['error'], 'Bad')
+        self.assertEqual(errors[1]['status'], 404)
+
+
+class TestBulkCommit(TestCase):
+
+    def test_commit_sends_single_bulk_request(self):
+        client = make_client()
+        with transaction.manager:
+            for i in range(20):
+                client.index_document(id=i, doc_type='Thing',
+                                      doc={'n': i})
+            client.delete_document(id=99, doc_type='Thing', safe=True)
+        self.assertEqual(len(client.es.bulk_bodies), 1)
+        lines = client.es.bulk_bodies[0].splitlines()
+        self.assertEqual(len(lines), 41)
+
+    def test_commit_chunked(self):
+        client = make_client(bulk_chunk_size=8)
+        with transaction.manager:
+            for i in range(20):
+                client.index_document(id=i, doc_type='Thing',
+                                      doc={'n': i})
+        self.assertEqual(len(client.es.bulk_bodies), 3)
+
+    def test_abort_sends_nothing(self):
+        client = make_client()
+        with self.assertRaises(RuntimeError):
+            with transaction.manager:
+                client.index_document(id=1, doc_type='Thing', doc={})
+                raise RuntimeError('fail!')
+        self.assertEqual(client.es.bulk_bodies, [])
+
+    def test_commit_error_report(self):
+        client = make_client(bulk_chunk_size=2)
+        client.es.statuses = {1: 409, 4: 500}
+        with self.assertRaises(BulkError) as cm:
+            with transaction.manager:
+                for i in range(6):
+                    client.index_document(id=i, doc_type='Thing',
+                                          doc={'n': i})
+        # All chunks were still sent.
+        self.assertEqual(len(client.es.bulk_bodies), 3)
+        self.assertEqual([err['id'] for err in cm.exception.errors], [1, 4])
+        self.assertEqual(len(client.uncommitted), 0)
+
+    def _sent(self, client):
+        return [json.loads(line) for body in client.es.bulk_bodies
+                for line in body.splitlines()]
+
+    def test_coalesce_operations(self):
+        client = make_client()
+        with transaction.manager:
+            for n in range(3):
+                client.index_document(id=1, doc_type='Thing', doc={'n': n})
+            client.index_document(id=2, doc_type='Thing', doc={'n': 0})
+            client.index_document(id=2, doc_type='Thing', doc={'n': 1})
+            client.delete_document(id=1, doc_type='Thing')
+            # Same id, different routing: a different document.
+            client.index_document(id=2, doc_type='Thing', doc={'n': 2},
+                                  parent=7)
+        self.assertEqual(self._sent(client), [
+            {'index': {'_index': client.index, '_type': 'Thing', '_id': 2}},
+            {'n': 1},
+            {'delete': {'_index': client.index, '_type': 'Thing', '_id': 1}},
+            {'index': {'_index': client.index, '_type': 'Thing', '_id': 2,
+                       '_parent': 7}},
+            {'n': 2},
+        ])
+
+    def test_coalesced_delete_ignores_missing(self):
+        client = make_client()
+        client.es.statuses = {1: 404, 2: 404}
+        with self.assertRaises(BulkError) as cm:
+            with transaction.manager:
+                # Created and deleted within the transaction: the document
+                # never made it into the index.
+                client.index_document(id=1, doc_type='Thing', doc={})
+                client.delete_document(id=1, doc_type='Thing')
+                client.delete_document(id=2, doc_type='Thing')
+        self.assertEqual([err['id'] for err in cm.exception.errors], [2])
+
+    def test_savepoint_rollback(self):
+        client = make_client()
+        with transaction.manager as txn:
+            client.index_document(id=1, doc_type='Thing', doc={'n': 0})
+            sp = txn.savepoint()
+            client.index_document(id=1, doc_type='Thing', doc={'n': 1})
+            client.delete_document(id=1, doc_type='Thing')
+            client.index_document(id=2, doc_type='Thing', doc={'n': 0})
+            sp.rollback()
+        self.assertEqual(self._sent(client), [
+            {'index': {'_index': client.index, '_type': 'Thing', '_id': 1}},
+            {'n': 0},
+        ])
+
+    def test_delete_object_reads_only_id(self):
+        client = make_client()
+        movie = Movie(title='Jaws', genre_id='abc')
+        # Building the whole document would load the genre.
+        movie.elastic_document = None
+        with transaction.manager:
+            client.delete_object(movie)
+        self.assertEqual(self._sent(client), [
+            {'delete': {'_index': client.index, '_type': 'Movie',
+                        '_id': movie.id, '_parent': 'abc'}},
+        ])
+
+    def test_update_object(self):
+        client = make_client()
+        movie = Movie(title='Jaws', year=1975, genre_id='abc')
+        movie.genre = None
+        with transaction.manager:
+            client.update_object(movie, fields=['year'], doc_as_upsert=True,
+                                 retry_on_conflict=3)
+        self.assertEqual(self._sent(client), [
+            {'update': {'_index': client.index, '_type': 'Movie',
+                        '_id': movie.id, '_parent': 'abc',
+                        '_retry_on_conflict': 3}},
+            {'doc': {'year': 1975}, 'doc_as_upsert': True},
+        ])
+        with self.assertRaises(ValueError):
+            client.update_object(movie, fields=['nope'])
+
+    def test_overridden_elastic_document(self):
+        client = make_client()
+        page = Page(id=1, slug='about', title='About us')
+        with transaction.manager:
+            client.update_object(page, fields=['title'])
+        with transaction.manager:
+            client.delete_object(page)
+        self.assertEqual(self._sent(client), [
+            {'update': {'_index': client.index, '_type': 'Page',
+                        '_id': 'about'}},
+            {'doc': {'title': 'ABOUT US'}},
+            {'delete': {'_index': client.index, '_type': 'Page',
+                        '_id': 'about'}},
+        ])
+        with self.assertRaises(ValueError):
+            client.update_object(page, fields=['nope'])
+
+    def test_update_immediate(self):
+        client = make_client()
+        calls = []
+        client.es.update = lambda **kw: calls.append(kw)
+        client.update_document(id=1, doc_type='Thing', doc={'n': 1},
+                               retry_on_conflict=2, immediate=True)
+        self.assertEqual(calls, [{'index': client.index, 'doc_type': 'Thing',
+                                  'id': 1, 'body': {'doc': {'n': 1}},
+                                  'retry_on_conflict': 2}])
+
+    def test_coalesce_updates(self):
+        client = make_client()
+        with transaction.manager:
+            client.index_document(id=1, doc_type='Thing',
+                                  doc={'a': 0, 'b': 0})
+            client.update_document(id=1, doc_type='Thing', doc={'a': 1})
+            client.update_document(id=2, doc_type='Thing', doc={'a': 1},
+                                   retry_on_conflict=1)
+            client.update_document(id=2, doc_type='Thing', doc={'b': 1},
+                                   doc_as_upsert=True)
+            client.delete_document(id=3, doc_type='Thing')
+            client.update_document(id=3, doc_type='Thing', doc={'a': 1},
+                                   doc_as_upsert=True)
+            client.delete_document(id=4, doc_type='Thing')
+            client.update_document(id=4, doc_type='Thing', doc={'a': 1})
+        self.assertEqual(self._sent(client), [
+            {'index': {'_index': client.index, '_type': 'Thing', '_id': 1}},
+            {'a': 1, 'b': 0},
+            {'update': {'_index': client.index, '_type': 'Thing', '_id': 2,
+                        '_retry_on_conflict': 1}},
+            {'doc': {'a': 1, 'b': 1}, 'doc_as_upsert': True},
+            {'index': {'_index': client.index, '_type': 'Thing', '_id': 3}},
+            {'a': 1},
+            {'delete': {'_index': client.index, '_type': 'Thing', '_id': 4}},
+        ])
+
+    def test_coalesce_nested_updates(self):
+        client = make_client()
+        with transaction.manager:
+            client.index_document(id=1, doc_type='Thing',
+                                  doc={'a': {'x': 0, 'y': 0}, 'b': 0})
+            client.update_document(id=1, doc_type='Thing',
+                                   doc={'a': {'x': 1}})
+            client.update_document(id=2, doc_type='Thing',
+                                   doc={'a': {'x': 1, 'z': {'p': 1}}})
+            client.update_document(id=2, doc_type='Thing',
+                                   doc={'a': {'y': 1, 'z': {'q': 1}}})
+            client.update_document(id=2, doc_type='Thing', doc={'c': [1]})
+        self.assertEqual(self._sent(client), [
+            {'index': {'_index': client.index, '_type': 'Thing', '_id': 1}},
+            {'a': {'x': 1, 'y': 0}, 'b': 0},
+            {'update': {'_index': client.index, '_type': 'Thing', '_id': 2}},
+            {'doc': {'a': {'x': 1, 'y': 1, 'z': {'p': 1, 'q': 1}},
+                     'c': [1]}},
+        ])
+
+    def test_disable_indexing(self):
+        client = make_client(disable_indexing=True)
+        with transaction.manager:
+            client.index_document(id=1, doc_type='Thing', doc={})
+        self.assertEqual(client.es.bulk_bodies, [])
+
+
+class TestConcurrentTransactions(TestCase):
+
+    def test_threads_have_separate_queues(self):
+        client = make_client()
+        n_threads = 16
+        n_docs = 25
+        errors = []
+        barrier = threading.Event()
+
+        def work(thread_id):
+            try:
+                barrier.wait()
+                for n in range(10):
+                    with transaction.manager:
+                        for i in range(n_docs):
+                            client.index_document(
+                                id='%d-%d-%d' % (thread_id, n, i),
+                                doc_type='Thing', doc={'thread': thread_id})
+                            time.sleep(0)
+                    # An aborted transaction must not leak into others.
+                    transaction.begin()
+                    client.delete_document(id='%d-%d-0' % (thread_id, n),
+                                           doc_type='Thing')
+                    transaction.abort()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(i,))
+                   for i in range(n_threads)]
+        for thread in threads:
+            thread.start()
+        barrier.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(client.es.bulk_bodies), n_threads * 10)
+        seen = set()
+        for body in client.es.bulk_bodies:
+            lines = [json.loads(line) for line in body.splitlines()]
+            self.assertEqual(len(lines), n_docs * 2)
+            self.assertEqual(len(set(line['thread'] for line in lines[1::2])),
+                             1)
+            seen.update(line['index']['_id'] for line in lines[::2])
+        self.assertEqual(len(seen), n_threads * 10 * n_docs)
+        self.assertEqual(len(client.uncommitted), 0)
+
+
+class TestReindexObjects(TestCase):
+
+    def _sent_ids(self, client):
+        return sorted(json.loads(line)['index']['_id']
+                      for body in client.es.bulk_bodies
+                      for line in body.splitlines()
+                      if 'index' in json.loads(line))
+
+    def test_reindex(self):
+        client = make_client()
+        genres = [Genre(title='Genre %d' % i) for i in range(25)]
+        seen = []
+        stats = client.reindex_objects(genres, chunk_size=10, workers=3,
+                                       progress=seen.append)
+        self.assertEqual(len(client.es.bulk_bodies), 3)
+        self.assertEqual(self._sent_ids(client),
+                         sorted(genre.id for genre in genres))
+        self.assertEqual(stats['actions'], 25)
+        self.assertEqual(stats['chunks'], 3)
+        self.assertEqual(stats['errors'], [])
+        self.assertEqual(sorted(s['actions'] for s in seen), [10, 20, 25])
+
+    def test_reindex_bypasses_transaction(self):
+        client = make_client()
+        with transaction.manager:
+            client.reindex_objects([Genre(title='Western')])
+            self.assertEqual(len(client.es.bulk_bodies), 1)
+        self.assertEqual(len(client.es.bulk_bodies), 1)
+
+    def test_reindex_errors(self):
+        client = make_client()
+        genres = [Genre(title='Genre %d' % i) for i in range(5)]
+        client.es.statuses = {genres[3].id: 400}
+        with self.assertRaises(BulkError) as cm:
+            client.reindex_objects(genres, chunk_size=2)
+        self.assertEqual([err['id'] for err in cm.exception.errors],
+                         [genres[3].id])
+
+    def test_reindex_optimize(self):
+        client = make_client()
+        client.reindex_objects([Genre(title='Noir')], optimize=True)
+        indices = client.es.indices
+        self.assertEqual(indices.put_settings_calls, [
+            {'index': {'refresh_interval': '-1', 'number_of_replicas': 0}},
+            {'index': {'refresh_interval': '1s', 'number_of_replicas': '1'}},
+        ])
+        self.assertEqual(indices.refreshed, 1)
+
+    def test_reindex_disable_indexing(self):
+        client = make_client(disable_indexing=True)
+        stats = client.reindex_objects([Genre(title='Noir')])
+        self.assertEqual(stats['actions'], 0)
+        self.assertEqual(stats['errors'], [])
+        self.assertEqual(client.es.bulk_bodies, [])
+
+    def test_reindex_progress_error(self):
+        client = make_client()
+
+        def progress(stats):
+            raise RuntimeError('progress failed')
+
+        with self.assertRaises(RuntimeError):
+            client.reindex_objects([Genre(title='Noir')], progress=progress)
+
+    def test_reindex_optimize_failure(self):
+        client = make_client()
+        es = client.es
+
+        def bulk(body, index=None):
+            raise ConnectionError('N/A', 'Connection refused', None)
+
+        def put_settings(index, body):
+            if es.indices.put_settings_calls:
+                raise RuntimeError('Cannot restore settings')
+            es.indices.put_settings_calls.append(body)
+
+        es.bulk = bulk
+        es.indices.put_settings = put_settings
+        # The bulk failure is raised, not the failure to restore settings.
+        with self.assertRaises(ConnectionError):
+            client.reindex_objects([Genre(title='Noir')], optimize=True,
+                                   workers=1)
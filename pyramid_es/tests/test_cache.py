@@ -0,0 +1,180 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+from unittest import TestCase
+
+import transaction
+
+from ..cache import ResultCache
+from .. import client_from_config
+
+from .fake import make_client
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResultCache(TestCase):
+
+    def _make_cache(self, **kw):
+        self.clock = FakeClock()
+        return ResultCache(clock=self.clock, **kw)
+
+    def test_get_set(self):
+        cache = self._make_cache()
+        key = cache.make_key(['Thing'], {'query': {}}, {'size': 10})
+        self.assertIsNone(cache.get(key))
+        cache.set(key, '{"hits": 1}', ['Thing'])
+        self.assertEqual(cache.get(key), '{"hits": 1}')
+        self.assertEqual(cache.size, 11)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_canonical_key(self):
+        key1 = ResultCache.make_key(['B', 'A'], {'a': 1, 'b': 2},
+                                    {'size': 1, 'from_': 0})
+        key2 = ResultCache.make_key(['A', 'B'], {'b': 2, 'a': 1},
+                                    {'from_': 0, 'size': 1})
+        self.assertEqual(key1, key2)
+        key3 = ResultCache.make_key(['A', 'B'], {'b': 2, 'a': 1},
+                                    {'from_': 10, 'size': 1})
+        self.assertNotEqual(key1, key3)
+
+    def test_ttl(self):
+        cache = self._make_cache(default_ttl=10)
+        cache.set('a', '1', ['Thing'])
+        cache.set('b', '2', ['Thing'], ttl=100)
+        self.clock.now += 50
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), '2')
+        self.assertEqual(cache.size, 1)
+
+    def test_lru_eviction(self):
+        cache = self._make_cache(max_bytes=25)
+        cache.set('a', 'a' * 10, ['Thing'])
+        cache.set('b', 'b' * 10, ['Thing'])
+        cache.get('a')
+        cache.set('c', 'c' * 10, ['Thing'])
+        self.assertEqual(cache.get('a'), 'a' * 10)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 'c' * 10)
+        self.assertEqual(cache.size, 20)
+
+    def test_too_large(self):
+        cache = self._make_cache(max_bytes=5)
+        cache.set('a', 'a' * 10, ['Thing'])
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate(self):
+        cache = self._make_cache()
+        cache.set('things', '1', ['Thing'])
+        cache.set('widgets', '2', ['Widget', 'Gadget'])
+        cache.set('everything', '3', [])
+        cache.invalidate(['Gadget'])
+        self.assertEqual(cache.get('things'), '1')
+        self.assertIsNone(cache.get('widgets'))
+        self.assertIsNone(cache.get('everything'))
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+
+    def test_write_grace(self):
+        cache = self._make_cache(write_grace=1.0)
+        cache.invalidate(['Thing'])
+        # A search racing with the refresh after the write isn't stored.
+        cache.set('things', '1', ['Thing'])
+        cache.set('everything', '2', [])
+        cache.set('widgets', '3', ['Widget'])
+        self.assertIsNone(cache.get('things'))
+        self.assertIsNone(cache.get('everything'))
+        self.assertEqual(cache.get('widgets'), '3')
+        self.clock.now += 1.5
+        cache.set('things', '1', ['Thing'])
+        cache.set('everything', '2', [])
+        self.assertEqual(cache.get('things'), '1')
+        self.assertEqual(cache.get('everything'), '2')
+        # Writes to all types hold off every search.
+        cache.invalidate()
+        self.assertFalse(cache.storable(['Widget']))
+
+
+class TestClientCache(TestCase):
+
+    def _make_client(self, **kw):
+        client = make_client(cache=ResultCache(**kw))
+        client.es.search_response = {'took': 1,
+                                     'hits': {'total': 1, 'hits': []}}
+        return client
+
+    def test_query_cached(self):
+        client = self._make_client()
+        q = client.query('Thing').filter_term('color', 'red')
+        self.assertEqual(q.execute().total, 1)
+        self.assertEqual(q.execute().total, 1)
+        self.assertEqual(q.count(), 1)
+        # The count has a different size, so is a different entry.
+        self.assertEqual(len(client.es.search_calls), 2)
+
+    def test_cached_response_copied(self):
+        client = self._make_client()
+        q = client.query('Thing')
+        q.execute().raw['hits']['total'] = 100
+        q.execute().raw['hits']['total'] = 200
+        self.assertEqual(q.execute().total, 1)
+        self.assertEqual(len(client.es.search_calls), 1)
+
+    def test_no_cache(self):
+        client = self._make_client()
+        q = client.query('Thing').no_cache()
+        q.execute()
+        q.execute()
+        self.assertEqual(len(client.es.search_calls), 2)
+        self.assertEqual(len(client.cache), 0)
+
+    def test_cache_ttl(self):
+        client = self._make_client()
+        client.query('Thing').cache_ttl(0).execute()
+        self.assertEqual(len(client.cache), 0)
+
+    def test_commit_invalidates(self):
+        client = self._make_client(write_grace=0)
+        things = client.query('Thing')
+        widgets = client.query('Widget')
+        things.execute()
+        widgets.execute()
+        with transaction.manager:
+            client.index_document(id=1, doc_type='Thing', doc={})
+            # Not yet committed.
+            things.execute()
+            self.assertEqual(len(client.es.search_calls), 2)
+        things.execute()
+        widgets.execute()
+        self.assertEqual(len(client.es.search_calls), 3)
+
+    def test_immediate_write_invalidates(self):
+        client = self._make_client()
+        client.es.index = lambda **kw: None
+        q = client.query('Thing')
+        q.execute()
+        client.index_document(id=1, doc_type='Thing', doc={}, immediate=True)
+        q.execute()
+        self.assertEqual(len(client.es.search_calls), 2)
+        # Searches right after the write aren't cached, as ES may not have
+        # refreshed the index yet.
+        q.execute()
+        self.assertEqual(len(client.es.search_calls), 3)
+
+    def test_from_config(self):
+        client = client_from_config({'elastic.index': 'foo',
+                                     'elastic.cache': 'true',
+                                     'elastic.cache.max_bytes': '1024',
+                                     'elastic.cache.ttl': '5',
+                                     'elastic.cache.write_grace': '2.5'})
+        self.assertEqual(client.cache.max_bytes, 1024)
+        self.assertEqual(client.cache.default_ttl, 5)
+        self.assertEqual(client.cache.write_grace, 2.5)
+        client = client_from_config({'elastic.index': 'foo'})
+        self.assertIsNone(client.cache)
@@ -0,0 +1,72 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import zlib
+from unittest import TestCase
+
+from .. import client_from_config
+from ..client import ElasticClient
+from ..connection import CompressedHttpConnection, gzip_compress
+from ..testing import StubElasticServer
+
+from .data import Genre
+
+
+class TestCompressedConnection(TestCase):
+
+    def setUp(self):
+        self.server = StubElasticServer().start()
+        self.addCleanup(self.server.stop)
+
+    def test_gzip_compress(self):
+        data = b'{"title": "Genre"}\n' * 100
+        compressed = gzip_compress(data)
+        self.assertLess(len(compressed), len(data))
+        self.assertEqual(zlib.decompress(compressed, 16 + zlib.MAX_WBITS),
+                         data)
+
+    def test_bulk_compressed(self):
+        client = ElasticClient(servers=[self.server.host],
+                               index='pyramid_es_tests_gzip',
+                               use_transaction=False, http_compress=True,
+                               transport_options={'compress_min_bytes': 500})
+        client.reindex_objects([Genre(title='Genre %d' % i)
+                                for i in range(20)], workers=1)
+        self.assertEqual(len(self.server.docs), 20)
+        self.assertEqual(self.server.headers[-1]['content-encoding'], 'gzip')
+        self.assertIn('gzip', self.server.headers[-1]['accept-encoding'])
+
+        # Small bodies are sent as they are.
+        client.reindex_objects([Genre(title='Drama')], workers=1)
+        self.assertNotIn('content-encoding', self.server.headers[-1])
+        self.assertEqual(len(self.server.docs), 21)
+
+
+class TestTransportSettings(TestCase):
+
+    def test_from_config(self):
+        client = client_from_config({
+            'elastic.index': 'foo',
+            'elastic.servers': 'es1:9200\nes2:9200',
+            'elastic.timeout': '2.5',
+            'elastic.http_compress': 'true',
+            'elastic.transport.maxsize': '25',
+            'elastic.transport.dead_timeout': '30',
+            'elastic.transport.max_retries': '5',
+            'elastic.transport.retry_on_timeout': 'true',
+        })
+        transport = client.es.transport
+        self.assertEqual(transport.max_retries, 5)
+        self.assertTrue(transport.retry_on_timeout)
+        self.assertEqual(transport.connection_pool.dead_timeout, 30.0)
+        self.assertEqual(transport.kwargs['maxsize'], 25)
+        connections = transport.connection_pool.connections
+        self.assertEqual(len(connections), 2)
+        for connection in connections:
+            self.assertIsInstance(connection, CompressedHttpConnection)
+            self.assertEqual(connection.timeout, 2.5)
+
+    def test_defaults(self):
+        client = client_from_config({'elastic.index': 'foo'})
+        connection, = client.es.transport.connection_pool.connections
+        self.assertNotIsInstance(connection, CompressedHttpConnection)
+        self.assertEqual(connection.timeout, 10.0)
@@ -2,7 +2,7 @@ from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 from unittest import TestCase
 
-from ..dotdict import DotDict
+from ..dotdict import DotDict, LazyDotDict
 
 
 class TestDotDict(TestCase):
@@ -49,3 +49,49 @@ class TestDotDict(TestCase):
         dd = DotDict({'a': 1})
         self.assertIn(repr(dd), ["<DotDict({'a': 1})>",
                                  "<DotDict({u'a': 1})>"])
+
+
+class TestLazyDotDict(TestCase):
+    def test_get(self):
+        dd = LazyDotDict({'a': 42,
+                          'b': {'one': 1}})
+        self.assertEqual(dd.a, 42)
+        self.assertEqual(dd.b.one, 1)
+        self.assertEqual(dd.get('b').one, 1)
+        self.assertEqual(dd.get('c', 'nope'), 'nope')
+
+    def test_lazy_conversion(self):
+        source = {'a': {'b': {'c': 1}}}
+        dd = LazyDotDict(source)
+        self.assertIs(dict.__getitem__(dd, 'a'), source['a'])
+        sub = dd.a
+        self.assertIsInstance(sub, LazyDotDict)
+        # Converted once, then cached.
+        self.assertIs(dd.a, sub)
+        self.assertEqual(sub.b.c, 1)
+        # The source is left untouched.
+        self.assertIs(type(source['a']['b']), dict)
+
+    def test_list(self):
+        dd = LazyDotDict({
+            'members': [
+                {'id': 1, 'name': 'Bruce Banner'},
+                {'id': 2, 'name': 'Tony Stark'},
+                3,
+            ]
+        })
+        members = dd.members
+        self.assertEqual(members[1].name, 'Tony Stark')
+        self.assertEqual(members[2], 3)
+        self.assertIs(dd.members, members)
+
+    def test_items(self):
+        dd = LazyDotDict({'a': {'b': 1}})
+        (key, value), = dd.items()
+        self.assertEqual(value.b, 1)
+        self.assertEqual(dd.values()[0].b, 1)
+
+    def test_missing(self):
+        dd = LazyDotDict({'a': 1})
+        with self.assertRaises(KeyError):
+            dd.b
@@ -0,0 +1,125 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+from unittest import TestCase
+
+import transaction
+from pyramid.config import Configurator
+from webtest import TestApp
+
+from .. import get_client
+from ..instrument import RequestStats, ElasticEvent
+from ..testing import StubElasticServer
+
+from .data import Genre
+from .fake import make_client
+
+
+class TestListeners(TestCase):
+
+    def setUp(self):
+        self.client = make_client()
+        self.client.es.search_response = {'took': 3,
+                                          'hits': {'total': 0, 'hits': []}}
+        self.events = []
+        self.client.add_listener(self.events.append)
+
+    def test_query_events(self):
+        self.client.query('Thing', 'Widget').execute()
+        self.client.search({'query': {'match_all': {}}}, classes=['Thing'])
+        first, second = self.events
+        self.assertEqual(first.operation, 'search')
+        self.assertEqual(first.doc_types, ['Thing', 'Widget'])
+        self.assertEqual(first.took, 3)
+        self.assertGreater(first.body_bytes, 0)
+        self.assertGreater(first.wrap_time, 0)
+        self.assertGreaterEqual(first.elapsed, first.request_time)
+        self.assertEqual(second.doc_types, ['Thing'])
+        self.assertEqual(second.wrap_time, 0)
+
+    def test_commit_events(self):
+        with transaction.manager:
+            self.client.index_document(id=1, doc_type='Thing', doc={})
+            self.client.delete_document(id=2, doc_type='Widget')
+        bulk, commit = self.events
+        self.assertEqual((bulk.operation, bulk.count), ('bulk', 2))
+        self.assertEqual(bulk.doc_types, ['Thing', 'Widget'])
+        self.assertEqual(bulk.body_bytes,
+                         len(self.client.es.bulk_bodies[0]))
+        self.assertEqual((commit.operation, commit.count), ('commit', 2))
+
+    def test_error_event(self):
+        def fail(**kw):
+            raise RuntimeError('fail!')
+        self.client.es.search = fail
+        with self.assertRaises(RuntimeError):
+            self.client.query('Thing').count()
+        event, = self.events
+        self.assertIsInstance(event.error, RuntimeError)
+
+    def test_listener_error(self):
+        def fail(event):
+            raise ValueError('listener failed')
+        self.client.add_listener(fail)
+        self.client.query('Thing').count()
+        with transaction.manager:
+            self.client.index_document(id=1, doc_type='Thing', doc={})
+        self.assertEqual([event.operation for event in self.events],
+                         ['search', 'bulk', 'commit'])
+
+        def search(**kw):
+            raise RuntimeError('fail!')
+        self.client.es.search = search
+        with self.assertRaises(RuntimeError):
+            self.client.query('Thing').count()
+
+    def test_remove_listener(self):
+        self.client.remove_listener(self.events.append)
+        self.client.query('Thing').count()
+        self.assertEqual(self.events, [])
+
+    def test_request_stats(self):
+        stats = RequestStats()
+        for operation in ('search', 'bulk', 'commit'):
+            event = ElasticEvent(operation)
+            event.elapsed = event.request_time = 0.5
+            stats.add(event)
+        self.assertEqual(len(stats.events), 3)
+        self.assertEqual(stats.count, 2)
+        self.assertEqual(stats.elapsed, 1.0)
+
+
+def genres_view(request):
+    client = get_client(request)
+    result = client.query(Genre).execute()
+    client.query(Genre).count()
+    request.response.text = '%d %d' % (result.total,
+                                       request.elastic_stats.count)
+    return request.response
+
+
+class TestTween(TestCase):
+
+    def _make_app(self, **settings):
+        server = StubElasticServer().start()
+        self.addCleanup(server.stop)
+        settings.update({'elastic.index': 'pyramid_es_tests_app',
+                         'elastic.servers': [server.host]})
+        config = Configurator(settings=settings)
+        config.include('pyramid_es')
+        config.add_route('genres', '/')
+        config.add_view(genres_view, route_name='genres')
+        return TestApp(config.make_wsgi_app())
+
+    def test_headers(self):
+        app = self._make_app(**{'elastic.instrument': 'true',
+                                'elastic.instrument.headers': 'true'})
+        resp = app.get('/')
+        self.assertEqual(resp.text, '0 2')
+        self.assertEqual(resp.headers['X-Elastic-Count'], '2')
+        self.assertGreater(float(resp.headers['X-Elastic-Time']), 0)
+
+    def test_no_headers(self):
+        app = self._make_app(**{'elastic.instrument': 'true'})
+        resp = app.get('/')
+        self.assertEqual(resp.text, '0 2')
+        self.assertNotIn('X-Elastic-Count', resp.headers)
@@ -1,5 +1,7 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
+import threading
+import time
 from unittest import TestCase
 
 from ..mixin import ElasticMixin, ESMapping, ESString, ESProp
@@ -14,6 +16,18 @@ class ESColor(ESProp):
         ESProp.__init__(self, name, *args, filter=rgb_to_hex, **kwargs)
 
 
+class ESUpper(ESProp):
+    def __call__(self, instance):
+        return getattr(instance, self.name).upper()
+
+
+class ESSummary(ESMapping):
+    def __call__(self, instance):
+        doc = ESMapping.__call__(self, instance)
+        doc['summary'] = '%s:%s' % (doc['_id'], doc['name'])
+        return doc
+
+
 class Thing(object):
     def __init__(self, id, foreground, child=None):
         self.id = id
@@ -110,3 +124,127 @@ class TestMixin(TestCase):
 
         mapping_base.update(mapping_new)
         self.assertEqual(mapping_base['name']['analyzer'], 'lowercase')
+
+    def test_compile_matches_call(self):
+        mapping = ESMapping(
+            analyzer='lowercase',
+            properties=ESMapping(
+                ESColor('foreground'),
+                ESString('label', attr='id'),
+                ESProp('id'),
+                child=ESMapping(
+                    analyzer='lowercase',
+                    properties=ESMapping(
+                        ESColor('foreground')))))
+
+        thing1 = Thing(id=1, foreground=(40, 20, 27))
+        thing2 = Thing(id=2, foreground=(37, 88, 19), child=thing1)
+
+        extract = mapping.compile()
+        self.assertEqual(extract(thing2), mapping(thing2))
+        self.assertEqual(ESColor('foreground').compile()(thing1), '#28141b')
+        self.assertIs(ESMapping(ESProp('id')).compile()(thing1), thing1)
+
+    def test_compile_custom_call(self):
+        thing = Thing(id=1, foreground=(40, 20, 27))
+        thing.name = 'widget'
+        mapping = ESMapping(properties=ESMapping(ESUpper('name')))
+        self.assertEqual(mapping.compile()(thing), {'_id': 1,
+                                                    'name': 'WIDGET'})
+        self.assertEqual(mapping.compile(['name'])(thing),
+                         {'name': 'WIDGET'})
+
+        mapping = ESSummary(properties=ESMapping(ESProp('name')))
+        self.assertEqual(mapping.compile()(thing), mapping(thing))
+        self.assertEqual(mapping.compile()(thing)['summary'], '1:widget')
+        self.assertEqual(mapping.compile(['name'])(thing),
+                         {'name': 'widget'})
+        self.assertEqual(mapping.compile_id()(thing), 1)
+
+    def test_compile_dotted_name(self):
+        child = Thing(id=1, foreground=(40, 20, 27))
+        thing = Thing(id=2, foreground=(37, 88, 19), child=child)
+        # Like getattr(), the compiled extractor doesn't follow dots.
+        for prop in (ESProp('child.id'), ESColor('child.foreground')):
+            mapping = ESMapping(properties=ESMapping(prop))
+            with self.assertRaises(AttributeError):
+                mapping(thing)
+            with self.assertRaises(AttributeError):
+                mapping.compile()(thing)
+
+    def test_elastic_document_compiled_once(self):
+        calls = []
+
+        class Foo(ElasticMixin, Thing):
+            @classmethod
+            def elastic_mapping(cls):
+                calls.append(cls)
+                return ESMapping(properties=ESMapping(ESProp('id'),
+                                                      ESColor('foreground')))
+
+        class Bar(Foo):
+            pass
+
+        foo = Foo(id=1, foreground=(0, 0, 0))
+        self.assertEqual(foo.elastic_document(),
+                         {'_id': 1, 'id': 1, 'foreground': '#000000'})
+        Foo(id=2, foreground=(0, 0, 0)).elastic_document()
+        Bar(id=3, foreground=(0, 0, 0)).elastic_document()
+        self.assertEqual(calls, [Foo, Bar])
+
+    def test_cached_mapping(self):
+        calls = []
+
+        class Foo(ElasticMixin, Thing):
+            @classmethod
+            def elastic_mapping(cls):
+                calls.append(cls)
+                return ESMapping(properties=ESMapping(ESProp('id')))
+
+        class Bar(Foo):
+            pass
+
+        self.assertIs(Foo.cached_elastic_mapping(),
+                      Foo.cached_elastic_mapping())
+        Foo(id=1, foreground=None).elastic_document()
+        Bar(id=2, foreground=None).elastic_document()
+        self.assertEqual(calls, [Foo, Bar])
+
+        Foo.invalidate_elastic_mapping()
+        Bar(id=2, foreground=None).elastic_document()
+        Foo.cached_elastic_mapping()
+        self.assertEqual(calls, [Foo, Bar, Bar, Foo])
+
+    def test_cached_mapping_threads(self):
+        calls = []
+
+        class Foo(ElasticMixin, Thing):
+            @classmethod
+            def elastic_mapping(cls):
+                calls.append(cls)
+                time.sleep(0.01)
+                return ESMapping(properties=ESMapping(ESProp('id')))
+
+        threads = [threading.Thread(target=Foo.elastic_extractor)
+                   for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(calls, [Foo])
+
+    def test_compile_id(self):
+        class Explosive(object):
+            id = 7
+            parent_id = 3
+
+            @property
+            def expensive(self):
+                raise AssertionError('should not be read')
+
+        mapping = ESMapping(properties=ESMapping(ESProp('expensive')))
+        self.assertEqual(mapping.compile_id()(Explosive()), 7)
+
+        mapping = ESMapping(properties=ESMapping(
+            ESProp('expensive'), _id=ESProp('_id', attr='parent_id')))
+        self.assertEqual(mapping.compile_id()(Explosive()), 3)
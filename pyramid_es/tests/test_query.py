@@ -0,0 +1,384 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import json
+from unittest import TestCase
+
+from ..exceptions import ProjectionError, SearchError
+from ..query import ElasticQuery
+from ..result import ElasticResult, encode_cursor
+
+from .fake import FakeES, make_client
+
+
+def make_hits(n):
+    return [{'_id': i, '_type': 'Thing', '_score': 1.0,
+             '_source': {'n': i}} for i in range(n)]
+
+
+class ScrollES(FakeES):
+    """
+    Serves ``hits`` through the scroll API, ``page_size`` hits per page.
+    """
+
+    def __init__(self, hits):
+        FakeES.__init__(self)
+        self.hits = hits
+        self.searches = []
+        self.scrolls = 0
+        self.cleared = []
+
+    def _page(self, n):
+        return {'_scroll_id': 'scroll-%d' % n,
+                'hits': {'total': len(self.hits),
+                         'hits': self.hits[n * self.page_size:
+                                           (n + 1) * self.page_size]}}
+
+    def search(self, index=None, doc_type=None, body=None, **params):
+        self.searches.append(params)
+        self.page_size = params['size']
+        if params.get('search_type') == 'scan':
+            return {'_scroll_id': 'scroll-0',
+                    'hits': {'total': len(self.hits), 'hits': []}}
+        self.scrolls = 1
+        return self._page(0)
+
+    def scroll(self, scroll_id=None, scroll=None):
+        page = self._page(self.scrolls)
+        self.scrolls += 1
+        return page
+
+    def clear_scroll(self, scroll_id=None):
+        self.cleared.append(scroll_id)
+
+
+class TestScan(TestCase):
+
+    def _make_client(self, n):
+        client = make_client()
+        client.es = ScrollES(make_hits(n))
+        return client
+
+    def test_scan_unsorted(self):
+        client = self._make_client(25)
+        records = list(client.query('Thing').scan(page_size=10))
+        self.assertEqual([rec.n for rec in records], list(range(25)))
+        search, = client.es.searches
+        self.assertEqual(search['search_type'], 'scan')
+        self.assertEqual(search['scroll'], '5m')
+        self.assertEqual(client.es.cleared, ['scroll-3'])
+
+    def test_scan_empty(self):
+        client = self._make_client(0)
+        self.assertEqual(list(client.query('Thing').scan()), [])
+        self.assertEqual(len(client.es.cleared), 1)
+
+    def test_scan_sorted(self):
+        client = self._make_client(25)
+        q = client.query('Thing').order_by('n')
+        records = list(q.iter_all(page_size=10))
+        self.assertEqual(len(records), 25)
+        search, = client.es.searches
+        self.assertNotIn('search_type', search)
+        self.assertEqual(client.es.scrolls, 3)
+
+    def test_scan_is_lazy(self):
+        client = self._make_client(100)
+        it = client.query('Thing').order_by('n').scan(page_size=10)
+        self.assertEqual(client.es.searches, [])
+        self.assertEqual(next(it).n, 0)
+        self.assertEqual(client.es.scrolls, 1)
+
+    def test_scan_early_exit(self):
+        client = self._make_client(100)
+        it = client.query('Thing').scan(page_size=10)
+        for rec in it:
+            if rec.n == 15:
+                break
+        it.close()
+        self.assertEqual(client.es.scrolls, 2)
+        self.assertEqual(client.es.cleared, ['scroll-1'])
+
+    def test_scan_offset_limit(self):
+        client = self._make_client(50)
+        q = client.query('Thing').offset(5).limit(12)
+        records = list(q.scan(page_size=10))
+        self.assertEqual([rec.n for rec in records], list(range(5, 17)))
+        self.assertEqual(len(client.es.cleared), 1)
+
+
+class TestCompiledBody(TestCase):
+
+    def test_body_cached(self):
+        client = make_client()
+        q = client.query('Thing').filter_term('color', 'red')
+        body = q._search_body()
+        self.assertIs(q._search_body(), body)
+        self.assertIs(q._search_json(), q._search_json())
+        self.assertEqual(json.loads(q._search_json()), body)
+
+    def test_generate_invalidates(self):
+        client = make_client()
+        q1 = client.query('Thing').filter_term('color', 'red')
+        body1 = q1._search_body()
+        q2 = q1.filter_term('size', 'large')
+        body2 = q2._search_body()
+        self.assertIsNot(body1, body2)
+        self.assertEqual(body1['query']['filtered']['filter'],
+                         {'term': {'color': 'red'}})
+        self.assertEqual(
+            len(body2['query']['filtered']['filter']['bool']['must']), 2)
+        # Pagination doesn't affect the body.
+        q3 = q2.offset(10)
+        self.assertEqual(q3._search_json(), q2._search_json())
+
+    def test_execute_sends_cached_json(self):
+        client = make_client()
+        q = client.query('Thing').order_by('n')
+        q.execute(start=0, size=10)
+        q.execute(start=10, size=10)
+        (_, body1, params1), (_, body2, params2) = client.es.search_calls
+        self.assertIs(body1, body2)
+        self.assertEqual(params1['from_'], 0)
+        self.assertEqual(params2['from_'], 10)
+
+
+class TestFilterCompilation(TestCase):
+
+    def _filter(self, q):
+        return q._search_body()['query']['filtered']['filter']
+
+    def test_bool_filter(self):
+        q = make_client().query('Thing') \
+            .filter_term('tag', 'a') \
+            .filter_value_lower('n', 1) \
+            .filter_term('tag', 'b') \
+            .filter_term('color', 'red')
+        self.assertEqual(self._filter(q), {'bool': {'must': [
+            {'term': {'tag': 'a'}},
+            {'range': {'n': {'from': 1, 'include_lower': True}}},
+            {'term': {'tag': 'b'}},
+            {'term': {'color': 'red'}},
+        ]}})
+
+    def test_cache_option(self):
+        q = make_client().query('Thing') \
+            .filter_term('tag', 'a', cache=False) \
+            .filter_term('tag', 'b')
+        self.assertEqual(self._filter(q), {'bool': {'must': [
+            {'term': {'tag': 'a', '_cache': False}},
+            {'term': {'tag': 'b'}},
+        ]}})
+
+    def test_override(self):
+        class AndQuery(ElasticQuery):
+            def compile_filters(self, filters):
+                return {'and': filters}
+
+        q = make_client().query('Thing', cls=AndQuery) \
+            .filter_term('tag', 'a').filter_term('tag', 'b')
+        self.assertEqual(self._filter(q), {'and': [{'term': {'tag': 'a'}},
+                                                   {'term': {'tag': 'b'}}]})
+
+
+class TestSourceFiltering(TestCase):
+
+    def test_body(self):
+        client = make_client()
+        q = client.query('Thing')
+        self.assertNotIn('_source', q._search_body())
+        q1 = q.only('title', 'author.name').exclude('body')
+        self.assertEqual(q1._search_body()['_source'],
+                         {'include': ['title', 'author.name'],
+                          'exclude': ['body']})
+        q2 = q1.only('pubdate')
+        self.assertEqual(q2._search_body()['_source']['include'],
+                         ['title', 'author.name', 'pubdate'])
+        self.assertFalse(q.only()._search_body()['_source'])
+
+    def test_projected_records(self):
+        client = make_client()
+        client.es.search_response = {'took': 1, 'hits': {'total': 1, 'hits': [
+            {'_id': '1', '_type': 'Thing',
+             '_source': {'title': 'Grue', 'author': {'name': 'Zork'}}}]}}
+        q = client.query('Thing').only('title', 'author.name', 'pubdate')
+        record, = q.execute()
+        self.assertEqual(record.title, 'Grue')
+        self.assertEqual(record.author.name, 'Zork')
+        self.assertIsNone(record.body)
+
+        record, = q.strict().execute()
+        self.assertEqual(record.title, 'Grue')
+        with self.assertRaises(ProjectionError):
+            record.body
+        # Fields which were requested but are missing from the document.
+        with self.assertRaises(AttributeError) as cm:
+            record.pubdate
+        self.assertNotIsInstance(cm.exception, ProjectionError)
+
+
+class TestKeysetPagination(TestCase):
+
+    def _query(self):
+        client = make_client()
+        return client.query('Thing').order_by('date', desc=True) \
+            .order_by('rank').limit(2)
+
+    def test_first_page(self):
+        body = self._query().after(None)._search_body()
+        self.assertEqual(body['sort'], [{'date': {'order': 'desc'}},
+                                        {'rank': {'order': 'asc'}},
+                                        {'_uid': {'order': 'asc'}}])
+        self.assertNotIn('filtered', body['query'])
+
+    def test_next_page(self):
+        q = self._query()
+        page = ElasticResult({'hits': {'total': 10, 'hits': [
+            {'_id': 1, '_type': 'Thing', 'sort': [300, 1, 'Thing#1']},
+            {'_id': 2, '_type': 'Thing', 'sort': [200, 5, 'Thing#2']},
+        ]}}, keyset=True)
+        body = q.filter_term('color', 'red').after(page.cursor)._search_body()
+        self.assertEqual(body['query']['filtered']['filter']['bool']['must'], [
+            {'term': {'color': 'red'}},
+            {'bool': {'should': [
+                {'range': {'date': {'lt': 200}}},
+                {'bool': {'must': [{'term': {'date': 200}},
+                                   {'range': {'rank': {'gt': 5}}}]}},
+                {'bool': {'must': [{'term': {'date': 200}},
+                                   {'term': {'rank': 5}},
+                                   {'range': {'_uid': {'gt': 'Thing#2'}}}]}},
+            ]}},
+        ])
+
+    def test_cursor(self):
+        self.assertIsNone(ElasticResult({'hits': {'hits': []}},
+                                        keyset=True).cursor)
+        result = ElasticResult({'hits': {'hits': [{'_id': 1}]}}, keyset=True)
+        self.assertIsNone(result.cursor)
+
+    def test_cursor_requires_keyset(self):
+        q = self._query()
+        q.client.es.search_response = {'hits': {'total': 10, 'hits': [
+            {'_id': 1, '_type': 'Thing', 'sort': [300, 1]},
+        ]}}
+        # ES returns sort values for any sorted query, but they lack the
+        # _uid tiebreaker needed by after().
+        self.assertIsNone(q.execute().cursor)
+        q.client.es.search_response = {'hits': {'total': 10, 'hits': [
+            {'_id': 1, '_type': 'Thing', 'sort': [300, 1, 'Thing#1']},
+        ]}}
+        cursor = q.after(None).execute().cursor
+        self.assertEqual(cursor, encode_cursor([300, 1, 'Thing#1']))
+        q.after(cursor)._search_body()
+
+    def test_bad_cursor(self):
+        q = self._query()
+        with self.assertRaises(ValueError):
+            q.after('not a cursor!')
+        with self.assertRaises(ValueError):
+            q.after(encode_cursor([1, 'Thing#1']))._search_body()
+
+    def test_score_sort(self):
+        q = self._query().order_by('_score', desc=True)
+        with self.assertRaises(ValueError):
+            q.after(None)._search_body()
+        with self.assertRaises(ValueError):
+            q.after(encode_cursor([1.5, 'Thing#1']))._search_body()
+
+
+class TestAggregations(TestCase):
+
+    def test_body(self):
+        client = make_client()
+        q = client.query('Thing')
+        q2 = q.add_terms_aggregation(
+            'colors', 'color', size=5, shard_size=20,
+            aggs={'sizes': q.cardinality_agg('size')})
+        q3 = q2.add_date_histogram_aggregation('months', 'date', 'month') \
+            .add_range_aggregation('prices', 'price', [{'to': 10},
+                                                       {'from': 10}]) \
+            .add_histogram_aggregation('ratings', 'rating', 1)
+        self.assertNotIn('aggs', q._search_body())
+        self.assertEqual(list(q2._search_body()['aggs']), ['colors'])
+        self.assertEqual(q3._search_body()['aggs'], {
+            'colors': {
+                'terms': {'field': 'color', 'size': 5, 'shard_size': 20},
+                'aggs': {'sizes': {'cardinality': {'field': 'size'}}},
+            },
+            'months': {'date_histogram': {'field': 'date',
+                                          'interval': 'month'}},
+            'prices': {'range': {'field': 'price',
+                                 'ranges': [{'to': 10}, {'from': 10}]}},
+            'ratings': {'histogram': {'field': 'rating', 'interval': 1}},
+        })
+
+    def test_result(self):
+        result = ElasticResult({'hits': {'total': 3, 'hits': []},
+                                'aggregations': {'colors': {'buckets': [
+                                    {'key': 'red', 'doc_count': 2,
+                                     'sizes': {'value': 1}},
+                                    {'key': 'blue', 'doc_count': 1,
+                                     'sizes': {'value': 1}},
+                                ]}}})
+        buckets = result.aggregations.colors.buckets
+        self.assertEqual([(b.key, b.doc_count) for b in buckets],
+                         [('red', 2), ('blue', 1)])
+        self.assertEqual(buckets[0].sizes.value, 1)
+        self.assertIs(result.aggregations, result.aggregations)
+        self.assertIs(result.aggregations.colors.buckets, buckets)
+        self.assertEqual(ElasticResult({'hits': {}}).aggregations, {})
+
+
+class MultiSearchES(FakeES):
+
+    def __init__(self, responses):
+        FakeES.__init__(self)
+        self.responses = responses
+        self.msearch_calls = []
+
+    def msearch(self, body, index=None):
+        self.msearch_calls.append(body)
+        return {'responses': self.responses}
+
+
+class TestMultiExecute(TestCase):
+
+    def test_multi_execute(self):
+        client = make_client()
+        client.es = MultiSearchES([
+            {'hits': {'total': 3, 'hits': make_hits(3)}},
+            {'error': 'SearchPhaseExecutionException[boom]'},
+            {'hits': {'total': 42, 'hits': []}},
+        ])
+        q1 = client.query('Thing').order_by('n').limit(3)
+        q2 = client.query('Widget', 'Gadget').filter_term('color', 'red')
+        q3 = client.query('Thing').limit(0)
+        r1, r2, r3 = client.multi_execute(q1, q2, q3)
+
+        self.assertEqual([rec.n for rec in r1], [0, 1, 2])
+        self.assertIsInstance(r2, SearchError)
+        self.assertIn('boom', r2.error)
+        self.assertEqual(r3.total, 42)
+
+        body, = client.es.msearch_calls
+        self.assertEqual(len(body), 6)
+        self.assertEqual(body[0], {'type': 'Thing'})
+        self.assertEqual(body[1]['size'], 3)
+        self.assertEqual(body[1]['from'], 0)
+        self.assertEqual(body[1]['sort'], [{'n': {'order': 'asc'}}])
+        self.assertEqual(body[2], {'type': 'Widget,Gadget'})
+        self.assertEqual(body[3]['query'], q2._search_body()['query'])
+        self.assertEqual(body[5]['size'], 0)
+        # The cached body is left untouched.
+        self.assertNotIn('size', q1._search_body())
+
+    def test_multi_execute_raise(self):
+        client = make_client()
+        client.es = MultiSearchES([
+            {'error': 'SearchPhaseExecutionException[boom]'},
+        ])
+        with self.assertRaises(SearchError):
+            client.multi_execute(client.query('Thing'), raise_on_error=True)
+
+    def test_multi_execute_empty(self):
+        client = make_client()
+        self.assertEqual(client.multi_execute(), [])
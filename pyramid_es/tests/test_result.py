@@ -2,7 +2,8 @@ from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 from unittest import TestCase
 
-from ..result import ElasticResult, ElasticResultRecord
+from ..exceptions import ProjectionError
+from ..result import ElasticResult, ElasticResultRecord, Projection
 
 
 sample_record1 = {
@@ -101,7 +102,48 @@ class TestResultRecord(TestCase):
         with self.assertRaises(AttributeError):
             record.nonexistent
 
+    def test_record_attr_fields(self):
+        record = ElasticResultRecord({'_id': 1, 'fields': {'title': ['A']}})
+        self.assertEqual(record.title, ['A'])
+
+    def test_record_attr_nested(self):
+        record = ElasticResultRecord({
+            '_id': 1,
+            '_source': {'owner': {'name': 'Zork', 'tags': [{'t': 'x'}]}},
+        })
+        self.assertEqual(record.owner.name, 'Zork')
+        self.assertEqual(record.owner.tags[0].t, 'x')
+        self.assertEqual(record['_source'].owner.name, 'Zork')
+
+    def test_record_slots(self):
+        record = self._make_record()
+        with self.assertRaises(AttributeError):
+            record.__dict__
+
     def test_record_contains(self):
         record = self._make_record()
         self.assertIn('_score', record)
         self.assertNotIn('foo', record)
+
+
+class TestProjection(TestCase):
+
+    def test_loaded(self):
+        projection = Projection(['title', 'auth*.name'], ['body'])
+        self.assertTrue(projection.loaded('title'))
+        self.assertTrue(projection.loaded('author'))
+        self.assertFalse(projection.loaded('body'))
+        self.assertFalse(projection.loaded('pubdate'))
+        projection = Projection(exclude=['b*'])
+        self.assertTrue(projection.loaded('title'))
+        self.assertFalse(projection.loaded('body'))
+
+    def test_record(self):
+        projection = Projection(['name'])
+        record = ElasticResultRecord(sample_record1, projection)
+        self.assertEqual(record.name, 'Grue')
+        self.assertEqual(record._score, 0.85)
+        self.assertIsNone(record.size)
+        record.projection = Projection(['name'], strict=True)
+        with self.assertRaises(ProjectionError):
+            record.size
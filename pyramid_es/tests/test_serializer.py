@@ -0,0 +1,90 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import json
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import TestCase, skipIf
+
+from elasticsearch.serializer import JSONSerializer
+
+from .. import client_from_config
+from ..serializer import OrjsonSerializer, make_serializer
+from ..testing import StubElasticServer
+
+from .data import Genre
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+doc = {
+    'title': 'Caf\xe9 /\u2603',
+    'price': Decimal('12.50'),
+    'pubdate': date(2015, 3, 1),
+    'updated': datetime(2015, 3, 1, 12, 30, 15, 250),
+    'tags': ['a', 'b'],
+    'nested': {'n': 1, 'none': None, 'flag': True},
+}
+
+
+class TestSerializers(TestCase):
+
+    def _check(self, serializer):
+        expected = json.loads(JSONSerializer().dumps(doc))
+        data = serializer.dumps(doc)
+        self.assertIsInstance(data, type(''))
+        self.assertEqual(json.loads(data), expected)
+        self.assertEqual(serializer.loads(data), expected)
+        self.assertEqual(serializer.dumps('{"a": 1}'), '{"a": 1}')
+
+    @skipIf(orjson is None, 'orjson is not installed')
+    def test_orjson(self):
+        serializer = make_serializer('orjson')
+        self.assertIsInstance(serializer, OrjsonSerializer)
+        self._check(serializer)
+        # Too large for orjson.
+        self.assertEqual(json.loads(serializer.dumps({'n': 2 ** 70})),
+                         {'n': 2 ** 70})
+
+    def test_auto(self):
+        self._check(make_serializer('auto'))
+
+    def test_fallback(self):
+        modules = dict(sys.modules)
+        self.addCleanup(sys.modules.update, modules)
+        sys.modules['ujson'] = None
+        serializer = make_serializer('ujson')
+        self.assertIs(type(serializer), JSONSerializer)
+        self._check(serializer)
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            make_serializer('pickle')
+
+
+class TestSerializerSetting(TestCase):
+
+    def setUp(self):
+        self.server = StubElasticServer().start()
+        self.addCleanup(self.server.stop)
+
+    def test_from_config(self):
+        client = client_from_config({'elastic.index': 'foo'})
+        self.assertIs(type(client.serializer), JSONSerializer)
+
+        client = client_from_config({
+            'elastic.index': 'pyramid_es_tests_serializer',
+            'elastic.servers': self.server.host,
+            'elastic.use_transaction': 'false',
+            'elastic.serializer': 'auto',
+        })
+        self.assertIs(type(client.serializer), type(make_serializer('auto')))
+        client.reindex_objects([Genre(title='Genre %d' % i)
+                                for i in range(3)], workers=1)
+        result = client.query(Genre).execute()
+        self.assertEqual(result.total, 3)
+        self.assertEqual(sorted(record.title for record in result),
+                         ['Genre 0', 'Genre 1', 'Genre 2'])
@@ -0,0 +1,81 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import logging
+from unittest import TestCase
+
+import transaction
+
+from ..trace import trace_log
+
+from .fake import make_client
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestTrace(TestCase):
+
+    def setUp(self):
+        self.handler = ListHandler()
+        trace_log.addHandler(self.handler)
+        self.addCleanup(trace_log.removeHandler, self.handler)
+        self.addCleanup(trace_log.setLevel, trace_log.level)
+
+    def _commit(self, client):
+        with transaction.manager:
+            for n in range(3):
+                client.index_document(id=1, doc_type='Thing', doc={'n': n})
+            client.delete_document(id=2, doc_type='Thing')
+        return [(record.levelno, record.getMessage())
+                for record in self.handler.records]
+
+    def test_disabled(self):
+        trace_log.setLevel(logging.WARNING)
+        client = make_client()
+        with transaction.manager:
+            client.index_document(id=1, doc_type='Thing', doc={})
+            dm = transaction.get().data(client)
+            self.assertIsNone(dm.trace)
+        self.assertEqual(self.handler.records, [])
+
+    def test_summary(self):
+        trace_log.setLevel(logging.INFO)
+        client = make_client()
+        (level, message), = self._commit(client)
+        self.assertEqual(level, logging.INFO)
+        size = len(client.es.bulk_bodies[0])
+        self.assertTrue(message.startswith(
+            'committed: 4 op(s), 2 action(s), %d bytes in ' % size), message)
+
+    def test_verbose(self):
+        trace_log.setLevel(logging.DEBUG)
+        messages = [message for level, message in
+                    self._commit(make_client())]
+        self.assertEqual(messages[:5], [
+            'queued <BulkAction index Thing:1>',
+            'queued <BulkAction index Thing:1>',
+            'queued <BulkAction index Thing:1>',
+            'queued <BulkAction delete Thing:2>',
+            'tpc_begin: 2 pending action(s)',
+        ])
+        self.assertTrue(messages[-1].startswith('committed:'))
+
+    def test_aborted(self):
+        trace_log.setLevel(logging.INFO)
+        client = make_client()
+        with self.assertRaises(RuntimeError):
+            with transaction.manager:
+                client.index_document(id=1, doc_type='Thing', doc={})
+                raise RuntimeError('fail!')
+        record, = self.handler.records
+        self.assertTrue(record.getMessage().startswith('aborted: 1 op(s)'))
+
+    def test_sampling(self):
+        trace_log.setLevel(logging.DEBUG)
+        self.assertEqual(self._commit(make_client(trace_sample_rate=0)), [])
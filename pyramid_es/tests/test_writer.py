@@ -0,0 +1,164 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import gc
+import threading
+import weakref
+from unittest import TestCase
+
+import transaction
+from elasticsearch.exceptions import ConnectionError
+
+from .fake import FakeES, make_client
+
+
+class FlakyES(FakeES):
+    """
+    Fails the first ``failures`` bulk requests with a connection error.
+    """
+
+    def __init__(self, failures=0):
+        FakeES.__init__(self)
+        self.failures = failures
+
+    def bulk(self, body, index=None):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('N/A', 'Connection refused', None)
+        return FakeES.bulk(self, body, index=index)
+
+
+class FailOnceES(FakeES):
+    """
+    Fails the ``n``-th bulk request once with a connection error.
+    """
+
+    def __init__(self, n):
+        FakeES.__init__(self)
+        self.n = n
+        self.requests = 0
+
+    def bulk(self, body, index=None):
+        self.requests += 1
+        if self.requests == self.n:
+            raise ConnectionError('N/A', 'Connection refused', None)
+        return FakeES.bulk(self, body, index=index)
+
+
+class BlockingES(FakeES):
+    """
+    Blocks every bulk request until ``release`` is set.
+    """
+
+    def __init__(self):
+        FakeES.__init__(self)
+        self.release = threading.Event()
+
+    def bulk(self, body, index=None):
+        self.release.wait()
+        return FakeES.bulk(self, body, index=index)
+
+
+class TestAsyncWriter(TestCase):
+
+    def _make_client(self, es, **writer_options):
+        writer_options.setdefault('retry_backoff', 0.001)
+        client = make_client(commit_mode='async',
+                             writer_options=writer_options)
+        client.es = es
+        self.addCleanup(client.close)
+        return client
+
+    def test_commit_in_background(self):
+        client = self._make_client(FakeES())
+        with transaction.manager:
+            for i in range(5):
+                client.index_document(id=i, doc_type='Thing', doc={'n': i})
+        self.assertTrue(client.writer.flush(timeout=5))
+        self.assertEqual(len(client.es.bulk_bodies), 1)
+        stats = client.writer.stats()
+        self.assertEqual(stats['submitted'], 5)
+        self.assertEqual(stats['sent'], 5)
+        self.assertEqual(stats['depth'], 0)
+
+    def test_retry(self):
+        client = self._make_client(FlakyES(failures=2), max_retries=3)
+        with transaction.manager:
+            client.index_document(id=1, doc_type='Thing', doc={})
+        client.writer.flush(timeout=5)
+        stats = client.writer.stats()
+        self.assertEqual(stats['retried'], 2)
+        self.assertEqual(stats['sent'], 1)
+        self.assertEqual(stats['failed'], 0)
+
+    def test_retry_failed_chunk_only(self):
+        client = self._make_client(FailOnceES(2))
+        client.bulk_chunk_size = 2
+        with transaction.manager:
+            for i in range(6):
+                client.index_document(id=i, doc_type='Thing', doc={})
+        client.writer.flush(timeout=5)
+        # Each chunk is written once: the first isn't resent along with the
+        # retry of the second.
+        self.assertEqual(len(client.es.bulk_bodies), 3)
+        stats = client.writer.stats()
+        self.assertEqual(stats['retried'], 2)
+        self.assertEqual(stats['sent'], 6)
+
+    def test_give_up(self):
+        client = self._make_client(FlakyES(failures=5), max_retries=1)
+        with transaction.manager:
+            client.index_document(id=1, doc_type='Thing', doc={})
+        client.writer.flush(timeout=5)
+        stats = client.writer.stats()
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(client.es.bulk_bodies, [])
+
+    def test_item_errors(self):
+        es = FakeES(statuses={2: 400})
+        client = self._make_client(es)
+        with transaction.manager:
+            for i in range(3):
+                client.index_document(id=i, doc_type='Thing', doc={})
+        client.writer.flush(timeout=5)
+        stats = client.writer.stats()
+        self.assertEqual(stats['sent'], 2)
+        self.assertEqual(stats['failed'], 1)
+
+    def test_backpressure_drops(self):
+        es = BlockingES()
+        client = self._make_client(es, workers=1, queue_size=1,
+                                   put_timeout=0.1)
+        # One batch in flight, one waiting in the queue, the rest dropped.
+        for i in range(4):
+            with transaction.manager:
+                client.index_document(id=i, doc_type='Thing', doc={})
+        es.release.set()
+        client.writer.flush(timeout=5)
+        stats = client.writer.stats()
+        self.assertEqual(stats['dropped'], 2)
+        self.assertEqual(stats['sent'], 2)
+
+    def test_close_flushes(self):
+        client = self._make_client(FakeES())
+        with transaction.manager:
+            client.index_document(id=1, doc_type='Thing', doc={})
+        client.close()
+        self.assertEqual(len(client.es.bulk_bodies), 1)
+        with transaction.manager:
+            client.index_document(id=2, doc_type='Thing', doc={})
+        self.assertEqual(client.writer.stats()['dropped'], 1)
+
+    def test_closed_writer_released(self):
+        client = make_client(commit_mode='async')
+        client.es = FakeES()
+        with transaction.manager:
+            client.index_document(id=1, doc_type='Thing', doc={})
+        client.close()
+        ref = weakref.ref(client.writer)
+        del client
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_unknown_commit_mode(self):
+        with self.assertRaises(ValueError):
+            make_client(commit_mode='eventually')
@@ -0,0 +1,62 @@
+"""
+Tracing of transactional writes, on the ``pyramid_es.trace`` logger.
+
+At ``INFO`` level, one summary line is logged per transaction. At ``DEBUG``
+level, each queued operation and two-phase commit step is logged too. Only a
+sample of transactions is traced, set by the client's ``trace_sample_rate``.
+When the logger is disabled, tracing costs one level check per transaction.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import logging
+import random
+import time
+
+trace_log = logging.getLogger('pyramid_es.trace')
+
+
+class TransactionTrace(object):
+    """
+    Collects the operations of one transaction for logging.
+    """
+
+    def __init__(self, verbose):
+        self.verbose = verbose
+        self.start = time.time()
+        self.ops = 0
+
+    def op(self, action):
+        self.ops += 1
+        if self.verbose:
+            trace_log.debug('queued %r', action)
+
+    def phase(self, name, n_pending):
+        if self.verbose:
+            trace_log.debug('%s: %d pending action(s)', name, n_pending)
+
+    def summary(self, outcome, event=None):
+        """
+        Log the summary of the transaction. ``event`` is the
+        :py:class:`.instrument.ElasticEvent` of the commit, if any.
+        """
+        if event is None:
+            trace_log.info('%s: %d op(s) in %.1fms', outcome, self.ops,
+                           (time.time() - self.start) * 1000)
+        else:
+            trace_log.info('%s: %d op(s), %d action(s), %d bytes in %.1fms '
+                           '(commit %.1fms)', outcome, self.ops, event.count,
+                           event.body_bytes,
+                           (time.time() - self.start) * 1000,
+                           event.elapsed * 1000)
+
+
+def start_trace(sample_rate=1.0):
+    """
+    Return a :py:class:`TransactionTrace` for a new transaction, or None if
+    it isn't to be traced.
+    """
+    if not trace_log.isEnabledFor(logging.INFO):
+        return None
+    if sample_rate < 1.0 and random.random() >= sample_rate:
+        return None
+    return TransactionTrace(trace_log.isEnabledFor(logging.DEBUG))
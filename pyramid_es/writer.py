@@ -0,0 +1,220 @@
+"""
+Background writer used when a client is configured with
+``commit_mode='async'``: committed transactions hand their operations to a
+pool of worker threads instead of writing to ES in the request thread.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import atexit
+import logging
+import threading
+import time
+import weakref
+
+from six.moves import queue
+
+from .bulk import chunk_actions
+
+log = logging.getLogger(__name__)
+
+
+_STOP = object()
+
+_live_writers = weakref.WeakSet()
+
+
+@atexit.register
+def _close_writers():
+    for writer in list(_live_writers):
+        writer.close()
+
+
+class AsyncWriter(object):
+    """
+    Send batches of :py:class:`.bulk.BulkAction` instances to ES from a pool
+    of daemon threads, fed by a bounded queue.
+
+    When the queue is full, :py:meth:`submit` blocks for up to
+    ``put_timeout`` seconds before dropping the batch. Batches which fail with
+    an exception (for instance a connection error) are retried up to
+    ``max_retries`` times, with exponential backoff starting at
+    ``retry_backoff`` seconds. Batches are sent in ``_bulk`` chunks like
+    :py:meth:`.client.ElasticClient.bulk`, and only the chunk which failed is
+    retried. Per-item failures reported by ES are logged and counted, but not
+    retried.
+
+    Pending batches are flushed when the interpreter exits.
+    """
+
+    def __init__(self, client, workers=2, queue_size=100, put_timeout=1.0,
+                 max_retries=3, retry_backoff=0.5, shutdown_timeout=10.0):
+        self.client = client
+        self.workers = workers
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.shutdown_timeout = shutdown_timeout
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.counters = {
+            'submitted': 0,
+            'sent': 0,
+            'dropped': 0,
+            'failed': 0,
+            'retried': 0,
+        }
+        self._lock = threading.Lock()
+        self._threads = []
+        self._closed = False
+        self._pending = 0
+        self._idle = threading.Condition()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    @property
+    def depth(self):
+        """
+        The number of batches currently waiting to be sent.
+        """
+        return self.queue.qsize()
+
+    def stats(self):
+        """
+        Return a dict of counters (in number of operations) along with the
+        current queue depth (in batches).
+        """
+        with self._lock:
+            stats = dict(self.counters)
+        stats['depth'] = self.depth
+        return stats
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                t = threading.Thread(target=self._run,
+                                     name='pyramid_es-writer-%d' % n)
+                t.daemon = True
+                t.start()
+                self._threads.append(t)
+        _live_writers.add(self)
+
+    def submit(self, actions):
+        """
+        Queue a batch of actions to be sent in the background. Returns True if
+        the batch was queued, or False if it was dropped because the queue
+        stayed full for ``put_timeout`` seconds, or the writer is closed.
+        """
+        actions = list(actions)
+        if not actions:
+            return True
+        if self._closed:
+            log.warning('Writer is closed, dropping %d operation(s)',
+                        len(actions))
+            self._count('dropped', len(actions))
+            return False
+        self._start()
+        with self._idle:
+            self._pending += 1
+        try:
+            self.queue.put(actions, timeout=self.put_timeout)
+        except queue.Full:
+            self._done()
+            log.warning('Writer queue is full, dropping %d operation(s)',
+                        len(actions))
+            self._count('dropped', len(actions))
+            return False
+        self._count('submitted', len(actions))
+        return True
+
+    def _done(self):
+        with self._idle:
+            self._pending -= 1
+            if not self._pending:
+                self._idle.notify_all()
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is _STOP:
+                return
+            try:
+                self._send(batch)
+            except Exception:
+                log.exception('Failed to send %d operation(s)', len(batch))
+                self._count('failed', len(batch))
+            finally:
+                self._done()
+
+    def _send(self, batch):
+        client = self.client
+        if client.disable_indexing:
+            return
+        for chunk, body in chunk_actions(batch, client.serializer.dumps,
+                                         max_actions=client.bulk_chunk_size,
+                                         max_bytes=client.bulk_max_bytes):
+            self._send_chunk(chunk, body)
+
+    def _send_chunk(self, chunk, body):
+        attempt = 0
+        while True:
+            try:
+                errors = self.client._send_bulk(chunk, body)
+            except Exception:
+                if attempt >= self.max_retries:
+                    log.exception('Giving up on %d operation(s) after %d '
+                                  'attempt(s)', len(chunk), attempt + 1)
+                    self._count('failed', len(chunk))
+                    return
+                delay = self.retry_backoff * (2 ** attempt)
+                log.warning('Bulk write failed, retrying in %.2fs', delay,
+                            exc_info=True)
+                self._count('retried', len(chunk))
+                attempt += 1
+                time.sleep(delay)
+            else:
+                if errors:
+                    log.error('%d bulk operation(s) failed: %r',
+                              len(errors), errors)
+                    self._count('failed', len(errors))
+                self._count('sent', len(chunk) - len(errors))
+                return
+
+    def flush(self, timeout=None):
+        """
+        Block until every queued batch has been processed, or ``timeout``
+        seconds have passed. Returns True if the queue was drained.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._idle:
+            while self._pending:
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    self._idle.wait(remaining)
+                else:
+                    self._idle.wait()
+        return True
+
+    def close(self, timeout=None):
+        """
+        Stop accepting batches, flush the queue, and stop the worker threads.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        _live_writers.discard(self)
+        if timeout is None:
+            timeout = self.shutdown_timeout
+        if not self.flush(timeout):
+            log.warning('Writer closed with %d batch(es) still queued',
+                        self.depth)
+            return
+        for t in self._threads:
+            self.queue.put(_STOP)
+        for t in self._threads:
+            t.join(timeout)
@@ -13,6 +13,8 @@ setup(name='pyramid_es',
           'Programming Language :: Python :: 3',
           'Programming Language :: Python :: 3.3',
           'Programming Language :: Python :: 3.4',
+          'Programming Language :: Python :: 3.5',
+          'Programming Language :: Python :: 3.6',
           'Framework :: Pyramid',
           'Topic :: Internet :: WWW/HTTP :: Indexing/Search',
       ],
@@ -23,13 +25,17 @@ setup(name='pyramid_es',
       install_requires=[
           'pyramid>=1.4',
           'pyramid_tm',
-          'transaction',
+          'transaction>=2.1',
           'sqlalchemy>=0.8',
           'six>=1.5.2',
           'elasticsearch>=1.0.0,<2.0.0',
       ],
+      extras_require={
+          # pyramid_es.aio, Python 3.5.3 or later only.
+          'aio': ['aiohttp>=3.3'],
+      },
       license='MIT',
-      packages=find_packages(),
+      packages=find_packages(exclude=['benchmarks']),
       test_suite='nose.collector',
       tests_require=['nose'],
       zip_safe=False)